@@ -0,0 +1,190 @@
+import numpy as np
+
+WIN = 3000 # value of a won position, as in ABPlayer.get_score
+
+class Bitboard():
+    '''
+    Bitboard layout of a board size.
+
+    A side is stored as an int with bit col * (rows + 1) + h set for its disc
+    in column col at height h (h = 0 is the bottom row, row rows - 1 of the
+    board array); the extra bit on top of every column stays empty, so shifts
+    never wrap from one column into the next.
+
+    A position is identified by its key: the discs of player 1 plus the
+    mask of all discs plus the bottom row, which is unique because the
+    lowest empty bit of every column marks its height. The key of the
+    mirrored position has its columns in reverse order, and the smaller of
+    the two is the canonical key, shared by a position and its mirror image.
+    '''
+    def __init__(self, board_size=(6,7)):
+        self.board_size = board_size
+        rows, cols = board_size
+        self.height = rows + 1 # bits per column
+        if cols * self.height > 64:
+            raise ValueError("board of size {} does not fit into 64 bits".format(board_size))
+
+        # value of the bit of every cell of the (flattened) board array
+        self.weights = np.array([1 << self.bit(row, col) for row in range(rows) for col in range(cols)], dtype=np.uint64)
+        self.bottom = sum(1 << col * self.height for col in range(cols))
+        self.full = self.bottom * ((1 << rows) - 1)
+        self.odd_rows = sum(self.bottom << h for h in range(0, rows, 2))
+        self.column_mask = (1 << self.height) - 1
+
+    def bit(self, row, col):
+        return col * self.height + self.board_size[0] - 1 - row
+
+    def bitboards(self, board, color):
+        '''
+        Returns the bitboards (discs of color, discs of the other side).
+        '''
+        cells = np.asarray(board).ravel()
+        return int(self.weights @ (cells == color)), int(self.weights @ (cells == -color))
+
+    def playable(self, pos, opp):
+        '''
+        Returns the bitboard of the cells a disc can be dropped into.
+        '''
+        return ((pos | opp) + self.bottom) & self.full
+
+    def column(self, bits):
+        '''
+        Returns the column of the lowest set bit.
+        '''
+        return ((bits & -bits).bit_length() - 1) // self.height
+
+    def key(self, board):
+        '''
+        Returns the key of the board, unique for every position.
+        '''
+        pos, opp = self.bitboards(board, 1)
+        return pos + (pos | opp) + self.bottom
+
+    def mirror(self, key):
+        '''
+        Returns the key (or bitboard) with the columns in reverse order.
+        '''
+        cols = self.board_size[1]
+        mirrored = 0
+        for col in range(cols):
+            mirrored |= ((key >> col * self.height) & self.column_mask) << (cols - 1 - col) * self.height
+        return mirrored
+
+    def canonical_key(self, board):
+        '''
+        Returns the canonical key of the board and whether it is the key of
+        the mirrored board (moves then have to be mirrored as well).
+        '''
+        key = self.key(board)
+        mirrored = self.mirror(key)
+        return (mirrored, True) if mirrored < key else (key, False)
+
+    def mirror_move(self, move):
+        return self.board_size[1] - 1 - move
+
+class ThreatEvaluator(Bitboard):
+    '''
+    Threat-based evaluation of Connect Four boards on bitboards.
+
+    All lines of streak_length cells are precomputed once as masks (69 of
+    them on the 6x7 board). A threat is an empty cell that completes a line
+    for one side. Threats decide the endgame by the parity of their row: the
+    player who moved first profits from threats on odd rows (counted from the
+    bottom, h even), the second player from even rows.
+    '''
+    def __init__(self, board_size=(6,7), streak_length=4):
+        super().__init__(board_size)
+        self.streak_length = streak_length
+        rows, cols = board_size
+
+        self.line_masks = [] # one int per line
+        for row in range(rows):
+            for col in range(cols):
+                for dr, dc in [(1,1), (1,-1), (1,0), (0,1)]: # directions to explore, as in find_connected
+                    end_row, end_col = row + (streak_length - 1) * dr, col + (streak_length - 1) * dc
+                    if 0 <= end_row < rows and 0 <= end_col < cols:
+                        self.line_masks.append(sum(1 << self.bit(row + k * dr, col + k * dc) for k in range(streak_length)))
+        # weights of open lines (no disc of the other side) with 0, 1, ..., streak_length own discs
+        self.open_weights = [0, 0] + [4 * 5 ** k for k in range(streak_length - 2)] + [0]
+        self.good_threat = 60  # threat on a row of the own parity
+        self.other_threat = 30 # threat on a row of the other parity
+
+    def analyse(self, pos, opp):
+        '''
+        Returns the weighted count of open lines (lines without a disc of the
+        other side, positive for pos), the threats of both sides, and +-1 if
+        pos or opp has completed a line (0 otherwise).
+        '''
+        k = self.streak_length
+        open_value = my_threats = their_threats = won = 0
+        for mask in self.line_masks:
+            mine = (pos & mask).bit_count()
+            theirs = (opp & mask).bit_count()
+            if theirs == 0:
+                open_value += self.open_weights[mine]
+                if mine == k - 1:
+                    my_threats |= mask
+                elif mine == k:
+                    won = 1
+            elif mine == 0:
+                open_value -= self.open_weights[theirs]
+                if theirs == k - 1:
+                    their_threats |= mask
+                elif theirs == k:
+                    won = -1
+        return open_value, my_threats & ~pos, their_threats & ~opp, won
+
+    def evaluate(self, board, color):
+        '''
+        Returns the value of the board for color, who is to move:
+        +-WIN for completed lines, an immediate win of color or two threats of
+        the other side that cannot both be blocked, otherwise a heuristic from
+        open lines and threats (smaller than WIN / 3 in absolute value).
+        '''
+        pos, opp = self.bitboards(board, color)
+        open_value, my_threats, their_threats, won = self.analyse(pos, opp)
+        if won:
+            return won * WIN
+
+        playable = self.playable(pos, opp)
+        if my_threats & playable:
+            return WIN
+        forced = their_threats & playable
+        if forced & (forced - 1): # more than one cell to block
+            return -WIN
+
+        # with as many discs as the other side, color moved first
+        my_rows = self.odd_rows if pos.bit_count() == opp.bit_count() else self.full & ~self.odd_rows
+        their_rows = self.full & ~my_rows
+        value = (open_value
+                 + self.good_threat * ((my_threats & my_rows).bit_count() - (their_threats & their_rows).bit_count())
+                 + self.other_threat * ((my_threats & their_rows).bit_count() - (their_threats & my_rows).bit_count()))
+        return max(1 - WIN // 3, min(WIN // 3 - 1, value))
+
+    def decided(self, board, color):
+        '''
+        Returns +-WIN if the board is decided for color, who is to move (see
+        evaluate), 0 otherwise. Subclasses with a costlier evaluate inherit
+        this threat-only check.
+        '''
+        value = ThreatEvaluator.evaluate(self, board, color)
+        return value if abs(value) >= WIN else 0
+
+    def candidate_moves(self, board, color, moves):
+        '''
+        Returns the moves worth searching for color out of moves: only the
+        winning move if there is one, only the blocking move if the other side
+        threatens to win, otherwise the moves that do not give the other side a
+        threat to complete directly above (all moves if every move does).
+        '''
+        pos, opp = self.bitboards(board, color)
+        _, my_threats, their_threats, _ = self.analyse(pos, opp)
+        playable = self.playable(pos, opp)
+        if my_threats & playable:
+            return [self.column(my_threats & playable)]
+        if their_threats & playable:
+            return [self.column(their_threats & playable)]
+
+        unsafe = ((their_threats >> 1) & playable)
+        safe = [move for move in moves if not unsafe >> (move * self.height) & self.column_mask]
+        return safe if safe else moves
@@ -80,6 +80,11 @@ class ConnectFourEnv(gym.Env):
         def is_done(self):
             return self.res_type != ResultType.NONE
 
+    class Snapshot(NamedTuple):
+
+        board: np.ndarray
+        current_player: int
+
     def __init__(self, board_shape=(6, 7), window_width=512, window_height=512):
         super(ConnectFourEnv, self).__init__()
 
@@ -93,12 +98,16 @@ class ConnectFourEnv(gym.Env):
 
         self.__current_player = 1
         self.__board = np.zeros(self.board_shape, dtype=int)
+        # read-only view of the board, valid for the lifetime of the env (the board is only changed in place)
+        self.__board_view = self.__board.view()
+        self.__board_view.flags.writeable = False
+        self.__column_bits = 1 << np.arange(board_shape[1])
 
         self.__player_color = 1
         self.__screen = None
         self.__window_width = window_width
         self.__window_height = window_height
-        self.__rendered_board = self._update_board_render()
+        self.__rendered_board = None # rendered on demand in render()
 
     def change_player(self):
         self.__current_player *= -1
@@ -109,6 +118,14 @@ class ConnectFourEnv(gym.Env):
         done = step_result.is_done()
         return self.__board.copy(), reward, done, {}
 
+    def play(self, action: int) -> Tuple[np.ndarray, float, bool]:
+        """
+        Same as step, without copying the board: returns a read-only view of
+        the board (which follows all later moves), the reward and done.
+        """
+        step_result = self._step(action)
+        return self.__board_view, step_result.get_reward(self.__current_player), step_result.is_done()
+
     def _step(self, action: int) -> StepResult:
         result = ResultType.NONE
 
@@ -118,17 +135,15 @@ class ConnectFourEnv(gym.Env):
             )
 
         # Check and perform action
-        for index in list(reversed(range(self.board_shape[0]))):
-            if self.__board[index][action] == 0:
-                self.__board[index][action] = self.__current_player
-                break
+        index = self.board_shape[0] - 1 - np.count_nonzero(self.__board[:, action])
+        self.__board[index][action] = self.__current_player
 
         # Check if board is completely filled
         if np.count_nonzero(self.__board[0]) == self.board_shape[1]:
             result = ResultType.DRAW
         else:
             # Check win condition
-            if self.is_win_state():
+            if self.is_win_move(index, action):
                 result = ResultType.WIN1 if self.__current_player == 1 else ResultType.WIN2
         return self.StepResult(result)
 
@@ -136,15 +151,31 @@ class ConnectFourEnv(gym.Env):
     def board(self):
         return self.__board.copy()
 
+    @property
+    def board_view(self) -> np.ndarray:
+        """
+        Read-only view of the board, without a copy.
+        """
+        return self.__board_view
+
     def reset(self, board: Optional[np.ndarray] = None) -> np.ndarray:
         self.__current_player = 1
         if board is None:
-            self.__board = np.zeros(self.board_shape, dtype=int)
+            self.__board.fill(0)
         else:
-            self.__board = board
-        self.__rendered_board = self._update_board_render()
+            self.__board[...] = board # a copy, the caller keeps its array
         return self.board
 
+    def clone(self) -> Snapshot:
+        """
+        Snapshot of the game state (board and current player) for restore.
+        """
+        return self.Snapshot(self.__board.copy(), self.__current_player)
+
+    def restore(self, snapshot: Snapshot) -> None:
+        self.__board[...] = snapshot.board
+        self.__current_player = snapshot.current_player
+
     def render(self, mode: str = 'console', close: bool = False) -> None:
         if mode == 'console':
             replacements = {
@@ -232,6 +263,28 @@ class ConnectFourEnv(gym.Env):
 
         return False
 
+    def is_win_move(self, row: int, col: int) -> bool:
+        """
+        Tests only the lines through the disc at (row, col), enough after a
+        move on a board without a win.
+        """
+        player = self.__board[row][col]
+        for dr, dc in ((0, 1), (1, 0), (1, 1), (1, -1)):
+            count = 1
+            for sign in (1, -1):
+                r, c = row + sign * dr, col + sign * dc
+                while 0 <= r < self.board_shape[0] and 0 <= c < self.board_shape[1] and self.__board[r][c] == player:
+                    count += 1
+                    r, c = r + sign * dr, c + sign * dc
+            if count >= 4:
+                return True
+        return False
+
     def available_moves(self) -> frozenset:
-        return frozenset(
-            (i for i in range(self.board_shape[1]) if self.is_valid_action(i)))
+        return frozenset(np.flatnonzero(self.__board[0] == 0).tolist())
+
+    def legal_moves_mask(self) -> int:
+        """
+        Bit i is set if column i is not full.
+        """
+        return int(self.__column_bits @ (self.__board[0] == 0))
@@ -0,0 +1,232 @@
+'''
+Learned position evaluation for ABPlayer (optional, needs PyTorch).
+
+A small CNN over two 6x7 planes (discs of the side to move, discs of the
+other side) predicts the outcome of a position, trained on games of
+ABPlayer against itself. Usage:
+
+    python nn_evaluator.py --games 200 --epochs 20 --save value_net.pt
+    python nn_evaluator.py --load value_net.pt --benchmark
+
+and in a game: ABPlayer(1, -1, evaluator=NNEvaluator.load("value_net.pt"))
+'''
+import argparse
+import random
+import time
+from collections import OrderedDict
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, TensorDataset
+
+from bitboard import ThreatEvaluator, WIN
+from player import ABPlayer
+
+SCALE = 900 # evaluation of a network output of 1, below the 1000 that marks decided positions
+
+def planes(boards, colors):
+    '''
+    Returns the network input (N x 2 x rows x cols) for boards with colors to
+    move: the discs of the side to move and the discs of the other side.
+    '''
+    boards = np.asarray(boards) * np.asarray(colors).reshape(-1, 1, 1)
+    return torch.as_tensor(np.stack([boards == 1, boards == -1], axis=1), dtype=torch.float32)
+
+class ValueNet(nn.Module):
+    '''expected outcome (-1 ... 1) of a position for the side to move'''
+    def __init__(self, board_size=(6,7), channels=32, hidden=64):
+        super(ValueNet, self).__init__()
+        self.board_size = board_size
+        self.conv = nn.Sequential(
+            nn.Conv2d(2, channels, 3, padding=1), nn.ReLU(),
+            nn.Conv2d(channels, channels, 3, padding=1), nn.ReLU())
+        self.head = nn.Sequential(
+            nn.Flatten(), nn.Linear(channels * board_size[0] * board_size[1], hidden), nn.ReLU(),
+            nn.Linear(hidden, 1), nn.Tanh())
+
+    def forward(self, x):
+        return self.head(self.conv(x)).view(-1)
+
+class NNEvaluator(ThreatEvaluator):
+    '''
+    Evaluation by a ValueNet behind the interface of ThreatEvaluator.
+
+    Decided positions (completed lines, immediate wins, double threats) keep
+    the threat evaluation, so do candidate_moves and decided, which ABPlayer
+    asks above the leaves: only the leaves of the search that are not decided
+    go through the network. evaluate_many scores a list of positions with one
+    forward pass; ABPlayer calls it with all leaves below a node, so the
+    following evaluate calls are answered from the cache. The cache keeps the
+    cache_size most recently used evaluations by canonical key and side to
+    move, so a position and its mirror image share an entry.
+    '''
+    def __init__(self, net=None, board_size=(6,7), streak_length=4, cache_size=1 << 16):
+        super(NNEvaluator, self).__init__(board_size, streak_length)
+        self.net = net if net is not None else ValueNet(board_size)
+        self.net.eval()
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.hits = 0        # evaluations answered from the cache
+        self.evaluations = 0 # positions evaluated by the network
+        self.batches = 0     # forward passes
+
+    @staticmethod
+    def load(path, board_size=(6,7), **options):
+        net = ValueNet(board_size)
+        net.load_state_dict(torch.load(path))
+        return NNEvaluator(net, board_size, **options)
+
+    def forward(self, boards, color):
+        '''
+        Returns the network's evaluations of boards for color, in one pass.
+        '''
+        with torch.no_grad():
+            out = self.net(planes(boards, [color] * len(boards)))
+        self.evaluations += len(boards)
+        self.batches += 1
+        return [int(round(SCALE * value)) for value in out.tolist()]
+
+    def remember(self, key, value):
+        self.cache[key] = value
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False) # least recently used
+
+    def evaluate_many(self, boards, color):
+        '''
+        Returns the evaluations of boards for color, who is to move.
+        '''
+        values = [None] * len(boards)
+        keys = [None] * len(boards)
+        pending = [] # positions for the network
+        for i, board in enumerate(boards):
+            keys[i] = (self.canonical_key(board)[0], color)
+            value = self.cache.get(keys[i])
+            if value is not None:
+                self.cache.move_to_end(keys[i])
+                self.hits += 1
+            else:
+                value = ThreatEvaluator.evaluate(self, board, color)
+                if abs(value) < WIN:
+                    pending.append(i)
+                    continue
+                self.remember(keys[i], value)
+            values[i] = value
+
+        if pending:
+            for i, value in zip(pending, self.forward([boards[i] for i in pending], color)):
+                values[i] = value
+                self.remember(keys[i], value)
+        return values
+
+    def evaluate(self, board, color):
+        return self.evaluate_many([board], color)[0]
+
+def self_play(games, depth=2, epsilon=0.2, seed=None):
+    '''
+    Plays games of ABPlayer (with ThreatEvaluator) against itself, with a
+    random move instead of the searched one with probability epsilon.
+    Returns the boards, the colors to move and the outcomes for the side to
+    move (1 won, -1 lost, 0 draw), with mirror images added.
+    '''
+    rng = random.Random(seed)
+    evaluator = ThreatEvaluator()
+    boards, colors, outcomes = [], [], []
+    for game in range(games):
+        first = rng.choice([1, -1])
+        players = {color: ABPlayer(color, -color, depth=depth, evaluator=evaluator) for color in (1, -1)}
+        board = np.zeros(evaluator.board_size, dtype=int)
+        color = first
+        positions = []
+        winner = 0
+        while True:
+            moves = players[color].get_all_valid_moves(board, color)
+            if not moves:
+                break
+            positions.append((board.copy(), color))
+            move = rng.choice(moves) if rng.random() < epsilon else players[color].move(board)
+            players[color].play_move(move, board, color)
+            if evaluator.analyse(*evaluator.bitboards(board, color))[3] == 1:
+                winner = color
+                break
+            color = -color
+
+        for position, to_move in positions:
+            for b in (position, position[:, ::-1]):
+                boards.append(b)
+                colors.append(to_move)
+                outcomes.append(winner * to_move)
+    return np.array(boards), np.array(colors), np.array(outcomes, dtype=np.float32)
+
+def train(net, boards, colors, outcomes, epochs=20, batch_size=64, lr=1e-3, verbose=True):
+    '''
+    Fits the network to the outcomes (mean squared error), returns the mean
+    loss of every epoch.
+    '''
+    loader = DataLoader(TensorDataset(planes(boards, colors), torch.as_tensor(outcomes)), batch_size=batch_size, shuffle=True)
+    optimizer = torch.optim.Adam(net.parameters(), lr=lr)
+    loss_fn = nn.MSELoss()
+    losses = []
+    net.train()
+    for epoch in range(epochs):
+        total = 0.0
+        for xb, yb in loader:
+            loss = loss_fn(net(xb), yb)
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total += loss.item() * len(xb)
+        losses.append(total / len(loader.dataset))
+        if verbose:
+            print("Epoch {}, loss: {:.4f}".format(epoch, losses[-1]))
+    net.eval()
+    return losses
+
+def benchmark(evaluator, boards, color=1, batch_size=64, repeats=3):
+    '''
+    Returns the network evaluations per second of one forward pass per board
+    and of batches of batch_size boards (best of repeats).
+    '''
+    single, batched = 0.0, 0.0
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for board in boards:
+            evaluator.forward([board], color)
+        single = max(single, len(boards) / (time.perf_counter() - start))
+
+        start = time.perf_counter()
+        for i in range(0, len(boards), batch_size):
+            evaluator.forward(boards[i:i + batch_size], color)
+        batched = max(batched, len(boards) / (time.perf_counter() - start))
+    return single, batched
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and benchmark the learned Connect Four evaluator")
+    parser.add_argument("--games", type=int, default=0, help="self-play games to train on")
+    parser.add_argument("--depth", type=int, default=2, help="search depth in self-play")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--load", default=None, help="network weights to start from")
+    parser.add_argument("--save", default=None, help="file for the trained weights")
+    parser.add_argument("--benchmark", action="store_true", help="evaluations/sec unbatched vs. batched")
+    parser.add_argument("--batch-size", type=int, default=64)
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        torch.manual_seed(args.seed)
+    evaluator = NNEvaluator.load(args.load) if args.load else NNEvaluator()
+    if args.games:
+        boards, colors, outcomes = self_play(args.games, args.depth, seed=args.seed)
+        print("{} positions from {} games".format(len(boards), args.games))
+        train(evaluator.net, boards, colors, outcomes, args.epochs)
+        if args.save:
+            torch.save(evaluator.net.state_dict(), args.save)
+
+    if args.benchmark:
+        boards, _, _ = self_play(4, depth=1, epsilon=0.5, seed=args.seed)
+        single, batched = benchmark(evaluator, list(boards), batch_size=args.batch_size)
+        print("unbatched: {:.0f} evaluations/sec, batches of {}: {:.0f} evaluations/sec ({:.1f}x)".format(
+            single, args.batch_size, batched, batched / single))
+
+if __name__ == "__main__":
+    main()
@@ -2,11 +2,20 @@ import copy
 import time
 import numpy as np
 
+from bitboard import Bitboard
+
 MAXTIME = 4.7 #time limit in seconds
+ASPIRATION = 50 # half width of the aspiration window around the previous iteration's score
+EXACT, LOWER, UPPER = 0, 1, 2 # kinds of values in the transposition table
+
+class SearchTimeout(Exception):
+    '''raised inside the search when MAXTIME is reached'''
+    pass
 
 class ABPlayer():
-    '''alpha-beta pruning game player'''
-    def __init__(self, my_color, opponent_color, board_size=(6,7), streak_length=4, depth=3, it_deep=False):
+    '''alpha-beta pruning game player (negamax with principal variation search)'''
+    def __init__(self, my_color, opponent_color, board_size=(6,7), streak_length=4, depth=3, it_deep=False, evaluator=None,
+                 table_size=1 << 20):
         # game attributes
         self.my_color = my_color
         self.opponent_color = opponent_color
@@ -15,110 +24,181 @@ class ABPlayer():
         # a-b pruning attributes
         self.it_deep = it_deep
         self.in_depth = depth
-        self.depth = 0                # holds current depth in search tree
         self.maxdepth = self.in_depth # holds max depth in search tree from iterative deepening
+        self.nodes = 0                # nodes visited in the current move
+        self.nodes_per_depth = {}     # nodes visited by each completed ITD round of the current move
+        # evaluation: get_score if None, otherwise an object with evaluate(board, color), decided(board, color) (the value of
+        # decided positions, 0 for the others, used above the leaves) and candidate_moves(board, color, moves),
+        # and optionally evaluate_many(boards, color) to score the leaves below a node in one call
+        self.evaluator = evaluator
+        # transposition table: (canonical key, color to move) -> (depth, value, kind of value, best move), kept between moves
+        self.layout = Bitboard(board_size)
+        self.table_size = table_size # maximal number of entries, 0 for no table
+        self.table = {}
     def reset_atts(self):
-        self.depth = 0
         self.maxdepth = self.in_depth
 
     def move(self,board):
         self.time = time.time() # starting time
-        a = -float('Inf') # alpha
-        b =  float('Inf') # beta
-        
-        maxsearched = None # best move found so far in ITD
+        self.nodes = 0
+        self.nodes_per_depth = {}
+        moves = self.get_candidate_moves(board, self.my_color)
+        board = np.asarray(board)
+        empty = np.count_nonzero(board == 0)
+        if np.array_equal(board, board[:, ::-1]): # symmetric board: a move and its mirror image have the same value
+            moves = [move for move in moves if move <= self.layout.mirror_move(move)]
+
+        maxsearched = moves[0] if moves else None # best move found so far in ITD
+        value = None # score of the last completed ITD round
         itd = True
         while itd:
             self.maxdepth += 1
-            best_next = (-float('Inf'),(0,0)) #(best_successor_value, best_successor) # best successor found so far in current ITD round
+            nodes = self.nodes
+            try:
+                value, maxsearched = self.search_root(board, moves, value, maxsearched)
+            except SearchTimeout:
+                break
+            self.nodes_per_depth[self.maxdepth] = self.nodes - nodes
+            itd = self.it_deep and self.maxdepth < empty # deeper rounds cannot change anything
 
-            for move in self.get_all_valid_moves(board, self.my_color):
-                board_changed = self.get_board_copy(board)
-                self.play_move(move, board_changed, self.my_color)
-                
-                value = self.minvalue(board_changed, a, b)
-                if value == -float('Inf'):
-                    self.reset_atts()
-                    return maxsearched
-                    
-                if value > best_next[0]:
-                    best_next = (value, move)
-
-            self.depth = 0   
-            maxsearched = best_next[1]
-            itd = self.it_deep
-            
         self.reset_atts()
         return maxsearched
-        
-    def minvalue(self, board, a, b):
+
+    def search_root(self, board, moves, previous=None, pv_move=None):
+        '''
+        One ITD round at the root, returns (best value, best move).
+        Searches an aspiration window around the previous round's value first
+        and the full window only if the result falls outside of it.
+        '''
+        if previous is not None and abs(previous) < 1000:
+            a, b = previous - ASPIRATION, previous + ASPIRATION
+            value, move = self.pvs_root(board, moves, a, b, pv_move)
+            if a < value < b:
+                return value, move
+        return self.pvs_root(board, moves, -float('Inf'), float('Inf'), pv_move)
+
+    def pvs_root(self, board, moves, a, b, pv_move=None):
         '''
-        Min-part of alpha-beta pruning.
-        Returns the lowest-valued successor.
+        Principal variation search over the root moves, the best move of the
+        previous round first. Returns (best value, best move), fail-soft.
+        '''
+        if pv_move in moves:
+            moves = [pv_move] + [move for move in moves if move != pv_move]
+        best_next = (-float('Inf'), moves[0]) #(best_successor_value, best_successor)
+        for i, move in enumerate(moves):
+            board_changed = self.get_board_copy(board)
+            self.play_move(move, board_changed, self.my_color)
+            value = self.pvs_child(board_changed, 1, self.opponent_color, a, b, i == 0)
+            if value > best_next[0]:
+                best_next = (value, move)
+            if value >= b:
+                break
+            a = max(a, value)
+        return best_next
+
+    def pvs_child(self, board, ply, color, a, b, first):
+        '''
+        Value of a successor for the player who made the move (the negated
+        negamax value of the child): the first successor is searched with the
+        full window, the others with a null window and again with the full
+        window if they fail high.
+        '''
+        if first:
+            return -self.negamax(board, ply, color, -b, -a)
+        value = -self.negamax(board, ply, color, -a - 1, -a)
+        if a < value < b:
+            value = -self.negamax(board, ply, color, -b, -a)
+        return value
+
+    def negamax(self, board, ply, color, a, b):
+        '''
+        Alpha-beta pruning in negamax form.
+        Returns the value of the board for color, who is to move, ply moves
+        below the root. Positions and their mirror images share the entries
+        of the transposition table.
         '''
         if (time.time() - self.time) > MAXTIME: #max time reached
-            return -float('Inf')                               
-    
-        self.depth += 1  # proceeded to next layer        
-        moves = self.get_all_valid_moves(board,self.opponent_color)
-        
-        score = self.get_score(board)
-        if (moves == []) or (self.depth == self.maxdepth) or (abs(score) > 1000):
-            self.depth -= 1
+            raise SearchTimeout()
+        self.nodes += 1
+
+        depth = self.maxdepth - ply
+        table_move = None
+        if self.table_size and depth > 0:
+            key, mirrored = self.layout.canonical_key(board)
+            key = (key, color) # the same discs with the other side to move are another position
+            entry = self.table.get(key)
+            if entry is not None:
+                entry_depth, entry_value, kind, table_move = entry
+                if mirrored:
+                    table_move = self.layout.mirror_move(table_move)
+                if entry_depth >= depth and (kind == EXACT or (kind == LOWER and entry_value >= b) or (kind == UPPER and entry_value <= a)):
+                    return entry_value
+
+        moves = self.get_all_valid_moves(board, color)
+        if (moves == []) or (ply == self.maxdepth): #terminal or max depth reached
+            return self.evaluate(board, color)
+        score = self.evaluate(board, color) if self.evaluator is None else self.evaluator.decided(board, color)
+        if abs(score) > 1000: # decided, no need to search further
             return score
-            
-        node_value = float('Inf')
-        for move in moves:
-            board_changed = self.get_board_copy(board)
-            self.play_move(move, board_changed, self.opponent_color)
-            
-            returned_value = self.maxvalue(board_changed, a, b)
-            
-            if returned_value == -float('Inf'):
-                self.depth =- 1
-                return -float('Inf')
-            
-            node_value = min(node_value, returned_value)
-            if node_value <= a:  
-                self.depth -= 1
-                return node_value # no need to check other successors
-            b = min(b, node_value)
-        self.depth -= 1 # exitting this layer
-        return node_value
-        
-    def maxvalue(self, board, a, b):
+
+        moves = self.get_candidate_moves(board, color, moves)
+        if table_move in moves: # best move of an earlier search first
+            moves = [table_move] + [move for move in moves if move != table_move]
+        children = None
+        if depth == 1 and hasattr(self.evaluator, "evaluate_many"): # all successors are leaves, score them at once
+            children = [self.get_board_copy(board) for move in moves]
+            for move, board_changed in zip(moves, children):
+                self.play_move(move, board_changed, color)
+            self.evaluator.evaluate_many(children, self.get_opponent(color))
+
+        best_next = (-float('Inf'), moves[0]) #(best_successor_value, best_successor)
+        a_in = a
+        for i, move in enumerate(moves):
+            if children is not None:
+                board_changed = children[i]
+            else:
+                board_changed = self.get_board_copy(board)
+                self.play_move(move, board_changed, color)
+
+            value = self.pvs_child(board_changed, ply + 1, self.get_opponent(color), a, b, i == 0)
+            if value > best_next[0]:
+                best_next = (value, move)
+            if value >= b:
+                break # no need to check other successors
+            a = max(a, value)
+
+        if self.table_size:
+            self.store(key, mirrored, depth, best_next[0], a_in, b, best_next[1])
+        return best_next[0]
+
+    def store(self, key, mirrored, depth, value, a, b, move):
         '''
-        Maxpart of alpha-beta pruning.
-        Returns the highest-valued successor.
+        Stores a value searched with the window (a, b) in the transposition
+        table, the table is emptied when it is full.
         '''
-        if (time.time() - self.time) > MAXTIME: # max time reached
-            return -float('Inf')
-            
-        self.depth += 1 # proceeded to next layer        
-        moves = self.get_all_valid_moves(board, self.my_color)
+        kind = LOWER if value >= b else UPPER if value <= a else EXACT
+        if len(self.table) >= self.table_size:
+            self.table.clear()
+        self.table[key] = (depth, value, kind, self.layout.mirror_move(move) if mirrored else move)
+
+    def evaluate(self, board, color):
+        '''
+        Returns the evaluation of the board for color, who is to move.
+        '''
+        if self.evaluator is not None:
+            return self.evaluator.evaluate(board, color)
         score = self.get_score(board)
-        if (moves == []) or (self.depth == self.maxdepth) or (abs(score) > 1000): #terminal or max depth reached
-            self.depth -= 1
-            return score
-            
-        node_value = -float('Inf')
-        for move in moves:
-            board_changed = self.get_board_copy(board)
-            self.play_move(move, board_changed, self.my_color)
-            
-            returned_value = self.minvalue(board_changed, a, b)
-            
-            if returned_value == -float('Inf'):
-                self.depth =- 1
-                return -float('Inf')
-                
-            node_value = max(node_value, returned_value)
-            if node_value >= b:
-                self.depth -= 1
-                return node_value
-            a = max(a, node_value)
-        self.depth -= 1
-        return node_value
+        return score if color == self.my_color else -score
+
+    def get_candidate_moves(self, board, color, moves=None):
+        '''
+        Returns the moves to search, the forced ones only if the evaluator finds any.
+        '''
+        if moves is None:
+            moves = self.get_all_valid_moves(board, color)
+        if self.evaluator is None or not moves:
+            return moves
+        return self.evaluator.candidate_moves(board, color, moves)
 
     def get_score(self, state):
         ''' 
@@ -7,8 +7,11 @@ import sys
 from gym_connect_four import ConnectFourEnv
 
 from player import ABPlayer
+from bitboard import ThreatEvaluator
 
 env: ConnectFourEnv = gym.make("ConnectFour-v0")
+evaluator = ThreatEvaluator() # precomputed line masks, shared by all moves
+student = ABPlayer(1, -1, evaluator=evaluator) # keeps its transposition table between moves
 
 SERVER_ADDRESS = "https://vilde.cs.lth.se/edap01-4inarow/"
 API_KEY = 'nyckel'
@@ -50,8 +53,7 @@ use your own algorithm for selecting actions too
 """
 def opponents_move(env, board):
    env.change_player() # change to oppoent
-   avmoves = env.available_moves()
-   if not avmoves:
+   if not env.legal_moves_mask():
       env.change_player() # change back to student before returning
       return -1
 
@@ -59,10 +61,10 @@ def opponents_move(env, board):
    # that way you get way more interesting games, and you can see if starting
    # is enough to guarrantee a win
    player = ABPlayer(-1, 1)
-   action = player.move(board)
-   #action = random.choice(list(avmoves))
+   action = player.move(env.board_view)
+   #action = random.choice(list(env.available_moves()))
 
-   state, reward, done, _ = env.step(action)
+   state, reward, done = env.play(action) # read-only view of the env's board, no copy
    if done:
       if reward == 1: # reward is always in current players view
          reward = -1
@@ -76,8 +78,7 @@ def student_move(board):
    (and change where it is called).
    The function should return a move from 0-6
    """
-   player = ABPlayer(1, -1)
-   move = player.move(board)
+   move = student.move(board)
    return move
 
 def play_game(vs_server = False, student_starts = True):
@@ -143,8 +144,7 @@ def play_game(vs_server = False, student_starts = True):
       else:
          if student_gets_move:
             # Execute your move
-            avmoves = env.available_moves()
-            if stmove not in avmoves:
+            if stmove is None or not 0 <= stmove < env.board_shape[1] or not env.legal_moves_mask() >> stmove & 1:
                print("You tied to make an illegal move! You have lost the game.")
                break
             state, result, done, _ = env.step(stmove)
@@ -0,0 +1,206 @@
+#
+# Micro-benchmarks for the localisation models, without Jupyter or widgets.
+#
+# Times the construction of the TransitionModel, one HMMFilter.update, one RobotSim.step and one
+# Localizer.update on a range of grid sizes, and one MultiResolutionLocalizer.update on a fine grid
+# of that size (with MULTIRES_FACTOR times fewer rows and columns on the coarse level). Every
+# component is repeated until it ran for at least --min-time seconds (and at least --repeats
+# times), the best of three such rounds gives ops/sec.
+# The peak memory of one operation is measured separately with tracemalloc (which slows things down).
+# The scaling exponent k of a component is the slope of log(time per op) over log(number of states),
+# i.e. time ~ S^k, fitted by least squares over all grid sizes.
+#
+# Results are printed and saved as JSON; with --baseline, the ops/sec are compared to an earlier run.
+#
+# Example (from the 02_Ex directory):
+#
+#   python benchmark.py --out bench.json
+#   python benchmark.py --sizes 10x10 50x50 --components hmm_update --baseline bench.json
+#
+
+import argparse
+import itertools
+import json
+import math
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from models import StateModel, TransitionModel, ObservationModel, Localizer, MultiResolutionLocalizer
+from models.RobotSimAndFilter import RobotSim, HMMFilter
+
+DEFAULT_SIZES = [(4, 4), (8, 8), (16, 16), (32, 32), (64, 64), (100, 100)]
+ROUNDS = 3
+MULTIRES_FACTOR = 4
+
+
+# every component is a function (rows, cols) -> operation, setting everything up that is not timed
+def setup_transition_model(rows, cols):
+    sm = StateModel(rows, cols)
+    return lambda: TransitionModel(sm)
+
+
+def setup_hmm_update(rows, cols):
+    sm = StateModel(rows, cols)
+    tm = TransitionModel(sm)
+    om = ObservationModel(sm)
+    hmm = HMMFilter(sm, tm, om)
+    readings = [random.choice([None, random.randrange(rows * cols)]) for _ in range(256)]
+    it = itertools.cycle(readings)
+    return lambda: hmm.update(next(it), 0)
+
+
+def setup_robot_step(rows, cols):
+    sm = StateModel(rows, cols)
+    rs = RobotSim(sm, TransitionModel(sm), ObservationModel(sm))
+    state = [random.randrange(sm.get_num_of_states())]
+
+    def step():
+        state[0], _ = rs.step(state[0])
+    return step
+
+
+def setup_localizer_update(rows, cols):
+    loc = Localizer(StateModel(rows, cols))
+    return loc.update
+
+
+def setup_multires_update(rows, cols):
+    factor = MULTIRES_FACTOR if rows % MULTIRES_FACTOR == 0 and cols % MULTIRES_FACTOR == 0 else 1
+    loc = MultiResolutionLocalizer(rows // factor, cols // factor, factor)
+    return loc.update
+
+
+COMPONENTS = {
+    "transition_model": setup_transition_model,
+    "hmm_update": setup_hmm_update,
+    "robot_step": setup_robot_step,
+    "localizer_update": setup_localizer_update,
+    "multires_update": setup_multires_update,
+}
+
+
+# best time per operation over ROUNDS rounds of at least min_time seconds / repeats operations
+def time_op(op, min_time, repeats) -> (float, int):
+    best = math.inf
+    total = 0
+    for _ in range(ROUNDS):
+        n = 0
+        start = time.perf_counter()
+        while True:
+            op()
+            n += 1
+            elapsed = time.perf_counter() - start
+            if n >= repeats and elapsed >= min_time:
+                break
+        best = min(best, elapsed / n)
+        total += n
+    return best, total
+
+
+# peak memory (bytes) allocated during one operation
+def peak_memory(op) -> int:
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        before = tracemalloc.get_traced_memory()[0]
+        op()
+        return tracemalloc.get_traced_memory()[1] - before
+    finally:
+        tracemalloc.stop()
+
+
+def run_benchmark(component, rows, cols, min_time, repeats, seed):
+    random.seed(seed)
+    np.random.seed(seed)
+    op = COMPONENTS[component](rows, cols)
+    op() # warm-up
+
+    seconds, n = time_op(op, min_time, repeats)
+    return {"component": component, "rows": rows, "cols": cols, "states": rows * cols * 4, "ops": n,
+            "us_per_op": seconds * 1e6, "ops_per_sec": 1.0 / seconds, "peak_bytes": peak_memory(op)}
+
+
+# slope of log(time) over log(states) per component (components with fewer than two sizes are left out)
+def scaling_exponents(results):
+    exponents = {}
+    for component in COMPONENTS:
+        points = [(math.log(r["states"]), math.log(r["us_per_op"])) for r in results if r["component"] == component]
+        if len(points) < 2:
+            continue
+        x, y = np.array(points).T
+        exponents[component] = float(np.polyfit(x, y, 1)[0])
+    return exponents
+
+
+def print_results(results, exponents, baseline=None):
+    previous = {}
+    if baseline:
+        previous = {(r["component"], r["rows"], r["cols"]): r for r in baseline["results"]}
+
+    print("{:<18} {:>9} {:>12} {:>14} {:>12} {:>9}".format(
+        "component", "grid", "us/op", "ops/sec", "peak [KiB]", "speedup"))
+    for r in results:
+        old = previous.get((r["component"], r["rows"], r["cols"]))
+        speedup = "{:.2f}x".format(r["ops_per_sec"] / old["ops_per_sec"]) if old else ""
+        print("{:<18} {:>9} {:>12.1f} {:>14.1f} {:>12.1f} {:>9}".format(
+            r["component"], "{}x{}".format(r["rows"], r["cols"]), r["us_per_op"], r["ops_per_sec"],
+            r["peak_bytes"] / 1024, speedup))
+
+    print()
+    for component, k in exponents.items():
+        old = baseline["scaling"].get(component) if baseline else None
+        print("{:<18} time ~ S^{:.2f}{}".format(component, k, "  (baseline S^{:.2f})".format(old) if old is not None else ""))
+
+
+def parse_size(text):
+    try:
+        rows, cols = text.lower().split("x")
+        return int(rows), int(cols)
+    except ValueError:
+        raise argparse.ArgumentTypeError("grid size must look like ROWSxCOLS, e.g. 8x8, got '{}'".format(text))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the localisation models")
+    parser.add_argument("--sizes", type=parse_size, nargs="+", default=DEFAULT_SIZES, help="grid sizes as ROWSxCOLS")
+    parser.add_argument("--components", nargs="+", default=list(COMPONENTS), choices=list(COMPONENTS),
+                        help="components to benchmark")
+    parser.add_argument("--min-time", type=float, default=0.2, help="minimum seconds per timing round")
+    parser.add_argument("--repeats", type=int, default=3, help="minimum operations per timing round")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    parser.add_argument("--baseline", default=None, help="JSON file of an earlier run to compare against")
+    parser.add_argument("--out", default=None, help="JSON file to save the results to")
+    args = parser.parse_args()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    results = []
+    for component in args.components:
+        for rows, cols in args.sizes:
+            results.append(run_benchmark(component, rows, cols, args.min_time, args.repeats, args.seed))
+            print("{} {}x{}: {:.1f} ops/sec".format(component, rows, cols, results[-1]["ops_per_sec"]), file=sys.stderr)
+    exponents = scaling_exponents(results)
+
+    print()
+    print_results(results, exponents, baseline)
+
+    if args.out:
+        report = {"created": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                  "numpy": np.__version__, "machine": platform.machine(), "processor": platform.processor(),
+                  "min_time": args.min_time, "repeats": args.repeats, "seed": args.seed,
+                  "results": results, "scaling": exponents}
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print("\nresults saved to {}".format(args.out), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+#
+# Headless experiment runner for the localisation models.
+#
+# Sweeps grid sizes, filter versions (see Localizer: 0 = full, 1 = no observation matrix,
+# 2 = no transition matrix, 3 = pure guessing) and random seeds, runs every combination in its
+# own worker process and streams the per-step Manhattan error, hit (error == 0) and step latency
+# of each run to one CSV (or Parquet) file. When all runs are done, a summary table with the
+# mean and a 95% confidence interval over the seeds is printed and written next to the run files.
+#
+# With --particles, the particle filter is compared against the exact filter instead: for every grid
+# size and seed one trajectory is simulated, and both filters run on the same readings. This gives
+# the accuracy / latency trade-off curve over the particle counts.
+#
+# Example (from the 02_Ex directory):
+#
+#   python experiment.py --sizes 4x4 6x6 8x8 --versions 0 1 2 3 --seeds 10 --steps 500 --out results
+#   python experiment.py --sizes 10x10 20x20 --particles 100 1000 10000 --seeds 5 --steps 500 --out results
+#
+
+import argparse
+import csv
+import math
+import os
+import random
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from models import StateModel, TransitionModel, ObservationModel, Localizer
+from models.RobotSimAndFilter import RobotSim, HMMFilter, ParticleFilter
+
+STEP_COLUMNS = ["step", "true_x", "true_y", "est_x", "est_y", "error", "hit", "latency_us"]
+TRADEOFF_COLUMNS = ["rows", "cols", "particles", "runs",
+                    "avg_error", "avg_error_ci", "agreement", "agreement_ci", "tv_distance", "tv_distance_ci",
+                    "latency_us", "latency_us_ci"]
+SUMMARY_COLUMNS = ["rows", "cols", "version", "runs", "steps",
+                   "avg_error", "avg_error_ci", "hit_rate", "hit_rate_ci", "p90_error", "p90_error_ci",
+                   "latency_us", "latency_us_ci"]
+
+# two-sided 95% quantiles of Student's t distribution for 1 ... 30 degrees of freedom,
+# larger samples use the normal quantile
+T_QUANTILES_95 = [12.706, 4.303, 3.182, 2.776, 2.571, 2.447, 2.365, 2.306, 2.262, 2.228,
+                  2.201, 2.179, 2.160, 2.145, 2.131, 2.120, 2.110, 2.101, 2.093, 2.086,
+                  2.080, 2.074, 2.069, 2.064, 2.060, 2.056, 2.052, 2.048, 2.045, 2.042]
+PARQUET_CHUNK = 10000
+
+
+# writes the per-step rows of one run, either as CSV (line by line) or as Parquet (in chunks)
+class StepWriter:
+    def __init__(self, path, fmt):
+        self.__fmt = fmt
+        if fmt == "csv":
+            self.__file = open(path, "w", newline="")
+            self.__writer = csv.writer(self.__file)
+            self.__writer.writerow(STEP_COLUMNS)
+        else:
+            import pyarrow
+            import pyarrow.parquet
+            self.__pa = pyarrow
+            self.__schema = pyarrow.schema([(c, pyarrow.float64() if c == "latency_us" else pyarrow.int64())
+                                            for c in STEP_COLUMNS])
+            self.__writer = pyarrow.parquet.ParquetWriter(path, self.__schema)
+            self.__rows = []
+
+    def write(self, row):
+        if self.__fmt == "csv":
+            self.__writer.writerow(row)
+        else:
+            self.__rows.append(row)
+            if len(self.__rows) >= PARQUET_CHUNK:
+                self.__flush()
+
+    def __flush(self):
+        columns = list(zip(*self.__rows))
+        self.__writer.write_table(self.__pa.Table.from_arrays(
+            [self.__pa.array(c, type=f.type) for c, f in zip(columns, self.__schema)], schema=self.__schema))
+        self.__rows = []
+
+    def close(self):
+        if self.__fmt == "csv":
+            self.__file.close()
+        else:
+            if self.__rows:
+                self.__flush()
+            self.__writer.close()
+
+
+# one run of the simulation for a single (rows, cols, version, seed) combination,
+# executed in a worker process. Returns the aggregated numbers of the run for the summary.
+def run_experiment(rows, cols, version, seed, steps, out_dir, fmt):
+    random.seed(seed)
+    np.random.seed(seed)
+
+    sm = StateModel(rows, cols)
+    loc = Localizer(sm, version)
+
+    path = os.path.join(out_dir, "run_{}x{}_v{}_s{}.{}".format(rows, cols, version, seed, fmt))
+    writer = StepWriter(path, fmt)
+    total_latency = 0.0
+    try:
+        for step in range(steps):
+            start = time.perf_counter()
+            _, tsX, tsY, _, _, _, eX, eY, error = loc.step()
+            latency = (time.perf_counter() - start) * 1e6
+
+            total_latency += latency
+            writer.write((step, tsX, tsY, eX, eY, int(error), int(error == 0), round(latency, 3)))
+    finally:
+        writer.close()
+
+    metrics = loc.get_metrics()
+    return {"rows": rows, "cols": cols, "version": version, "seed": seed, "steps": steps,
+            "avg_error": metrics.get_mean_error(), "hit_rate": metrics.get_hit_rate(),
+            "p90_error": metrics.get_percentile(90), "latency_us": total_latency / steps}
+
+
+# mean and half-width of the 95% confidence interval of the mean
+def mean_confidence(values):
+    n = len(values)
+    mean = sum(values) / n
+    if n < 2:
+        return mean, float("nan")
+    std = math.sqrt(sum((v - mean) ** 2 for v in values) / (n - 1))
+    t = T_QUANTILES_95[n - 2] if n - 1 <= len(T_QUANTILES_95) else 1.96
+    return mean, t * std / math.sqrt(n)
+
+
+def summarise(results):
+    groups = {}
+    for r in results:
+        groups.setdefault((r["rows"], r["cols"], r["version"]), []).append(r)
+
+    summary = []
+    for (rows, cols, version), runs in sorted(groups.items()):
+        row = {"rows": rows, "cols": cols, "version": version, "runs": len(runs),
+               "steps": sum(r["steps"] for r in runs)}
+        for key in ("avg_error", "hit_rate", "p90_error", "latency_us"):
+            row[key], row[key + "_ci"] = mean_confidence([r[key] for r in runs])
+        summary.append(row)
+    return summary
+
+
+def print_summary(summary):
+    print("{:>5} {:>5} {:>7} {:>4} {:>18} {:>18} {:>18} {:>20}".format(
+        "rows", "cols", "version", "runs", "avg error", "hit rate", "90% error", "latency [us]"))
+    for s in summary:
+        print("{:>5} {:>5} {:>7} {:>4} {:>9.3f} ± {:<6.3f} {:>9.3f} ± {:<6.3f} {:>9.3f} ± {:<6.3f} {:>10.1f} ± {:<7.1f}".format(
+            s["rows"], s["cols"], s["version"], s["runs"], s["avg_error"], s["avg_error_ci"],
+            s["hit_rate"], s["hit_rate_ci"], s["p90_error"], s["p90_error_ci"], s["latency_us"], s["latency_us_ci"]))
+
+
+def write_summary(summary, path):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_COLUMNS)
+        writer.writeheader()
+        writer.writerows(summary)
+
+
+# the exact filter (particles = 0) and particle filters with the given particle counts on the same
+# simulated trajectory. Per filter: Manhattan error to the true position, agreement of the estimated
+# position with the exact filter's, total variation distance to the exact belief and step latency.
+def run_tradeoff(rows, cols, particle_counts, seed, steps):
+    random.seed(seed)
+    np.random.seed(seed)
+
+    sm = StateModel(rows, cols)
+    tm = TransitionModel(sm)
+    om = ObservationModel(sm)
+    rs = RobotSim(sm, tm, om)
+
+    state = random.randint(0, sm.get_num_of_states() - 1)
+    trajectory = []
+    for _ in range(steps):
+        state, sense = rs.step(state)
+        trajectory.append((state, sense))
+
+    filters = [(0, HMMFilter(sm, tm, om, True))] + [(n, ParticleFilter(sm, tm, om, n)) for n in particle_counts]
+    totals = {n: [0.0, 0.0, 0.0, 0.0] for n, _ in filters} # error, agreement, tv distance, latency
+    for state, sense in trajectory:
+        exact = None
+        for n, f in filters:
+            start = time.perf_counter()
+            estimate = sm.state_to_position(f.update(sense, 0))
+            latency = (time.perf_counter() - start) * 1e6
+
+            beliefs = f.get_beliefs()
+            true_position = sm.state_to_position(state)
+            if exact is None:
+                exact = (beliefs, estimate)
+            totals[n][0] += abs(estimate[0] - true_position[0]) + abs(estimate[1] - true_position[1])
+            totals[n][1] += estimate == exact[1]
+            totals[n][2] += 0.5 * np.sum(np.abs(beliefs - exact[0]))
+            totals[n][3] += latency
+
+    return [{"rows": rows, "cols": cols, "particles": n, "seed": seed,
+             "avg_error": t[0] / steps, "agreement": t[1] / steps, "tv_distance": t[2] / steps, "latency_us": t[3] / steps}
+            for n, t in totals.items()]
+
+
+def tradeoff(sizes, particle_counts, seeds, steps, out_dir, workers=None):
+    os.makedirs(out_dir, exist_ok=True)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_tradeoff, rows, cols, particle_counts, seed, steps)
+                   for rows, cols in sizes for seed in seeds]
+        for future in as_completed(futures):
+            results.extend(future.result())
+
+    groups = {}
+    for r in results:
+        groups.setdefault((r["rows"], r["cols"], r["particles"]), []).append(r)
+    curve = []
+    for (rows, cols, particles), runs in sorted(groups.items()):
+        row = {"rows": rows, "cols": cols, "particles": particles, "runs": len(runs)}
+        for key in ("avg_error", "agreement", "tv_distance", "latency_us"):
+            row[key], row[key + "_ci"] = mean_confidence([r[key] for r in runs])
+        curve.append(row)
+
+    with open(os.path.join(out_dir, "tradeoff.csv"), "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=TRADEOFF_COLUMNS)
+        writer.writeheader()
+        writer.writerows(curve)
+    return curve
+
+
+def print_tradeoff(curve):
+    print("{:>5} {:>5} {:>9} {:>18} {:>18} {:>18} {:>20}".format(
+        "rows", "cols", "particles", "avg error", "agreement", "tv distance", "latency [us]"))
+    for c in curve:
+        print("{:>5} {:>5} {:>9} {:>9.3f} ± {:<6.3f} {:>9.3f} ± {:<6.3f} {:>9.3f} ± {:<6.3f} {:>10.1f} ± {:<7.1f}".format(
+            c["rows"], c["cols"], c["particles"] if c["particles"] else "exact", c["avg_error"], c["avg_error_ci"],
+            c["agreement"], c["agreement_ci"], c["tv_distance"], c["tv_distance_ci"], c["latency_us"], c["latency_us_ci"]))
+
+
+def parse_size(text):
+    try:
+        rows, cols = text.lower().split("x")
+        return int(rows), int(cols)
+    except ValueError:
+        raise argparse.ArgumentTypeError("grid size must look like ROWSxCOLS, e.g. 8x8, got '{}'".format(text))
+
+
+def sweep(sizes, versions, seeds, steps, out_dir, fmt="csv", workers=None):
+    os.makedirs(out_dir, exist_ok=True)
+    jobs = [(rows, cols, version, seed, steps, out_dir, fmt)
+            for rows, cols in sizes for version in versions for seed in seeds]
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(run_experiment, *job) for job in jobs]
+        for done, future in enumerate(as_completed(futures), 1):
+            r = future.result()
+            results.append(r)
+            print("[{}/{}] {}x{} version {} seed {}: avg error {:.3f}, hit rate {:.3f}".format(
+                done, len(jobs), r["rows"], r["cols"], r["version"], r["seed"], r["avg_error"], r["hit_rate"]))
+
+    summary = summarise(results)
+    write_summary(summary, os.path.join(out_dir, "summary.csv"))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run localisation experiments without the dashboard")
+    parser.add_argument("--sizes", type=parse_size, nargs="+", default=[(4, 4), (8, 8)],
+                        help="grid sizes as ROWSxCOLS")
+    parser.add_argument("--versions", type=int, nargs="+", default=[0, 1, 2, 3], choices=[0, 1, 2, 3],
+                        help="filter versions, 0 = full, 1 = no observation, 2 = no transition, 3 = guessing")
+    parser.add_argument("--seeds", type=int, default=5, help="number of seeds per combination")
+    parser.add_argument("--steps", type=int, default=500, help="number of simulation steps per run")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--particles", type=int, nargs="+", default=None,
+                        help="compare particle filters with these particle counts against the exact filter")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="format of the per-step files")
+    parser.add_argument("--out", default="results", help="output directory")
+    args = parser.parse_args()
+
+    if args.format == "parquet":
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            parser.error("--format parquet needs pyarrow to be installed")
+
+    start = time.perf_counter()
+    if args.particles:
+        print_tradeoff(tradeoff(args.sizes, args.particles, range(args.seeds), args.steps, args.out, args.workers))
+    else:
+        summary = sweep(args.sizes, args.versions, range(args.seeds), args.steps, args.out, args.format, args.workers)
+        print()
+        print_summary(summary)
+    print("\nfinished in {:.1f} s, results in {}".format(time.perf_counter() - start, args.out), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,26 +4,31 @@
 #
 
 import numpy as np
-import matplotlib.pyplot as plt
 # The Localizer is the "controller" for the process. In its update()-method, at the moment a mere skeleton, 
 # one cycle of the localisation process should be implemented by you. The return values of update() 
 # are assumed to go in exactly this form into the viewer, this means that you should only modify the 
 # return-parameters of update() if you do not want to use the graphical interface (or you need to change that too!)
 
 import random
-import importlib
+import time
 
-from models import StateModel,TransitionModel,ObservationModel,RobotSimAndFilter
+from models import StateModel,TransitionModel,ObservationModel,RobotSimAndFilter,SensorLog
+from models.Metrics import LocalizationMetrics
 
 
 class Localizer:
-    def __init__(self, sm, version = 0):
+    def __init__(self, sm, version = 0, robust = False, num_particles = None, threshold = None, top_k = None,
+                 motion = None, sensor = None):
 
-        self.__sm = sm
+        self.__sm = sm  # the obstacle map of the grid is part of the state model
 
-        self.__tm = TransitionModel(self.__sm)
-        self.__om = ObservationModel(self.__sm)
+        self.__tm = TransitionModel(self.__sm, motion)  # MotionSpec, None for the default policy
+        self.__om = ObservationModel(self.__sm, sensor)  # SensorSpec, None for the default sensor
         self.version = version  # version for evaluation purposes: 0 = full, 1 = no observation matrix, 2 = no transition matrix
+        self.robust = robust  # underflow-safe filtering that also tracks the log-likelihood of the readings
+        self.num_particles = num_particles  # use a particle filter with this many particles instead of the exact filter
+        self.threshold = threshold  # only keep states with at least this probability in the filter (active set)
+        self.top_k = top_k  # only keep the top_k most probable states in the filter (active set)
         # self.eval_type = eval_type # 0 = evaluation for one max prob., 1 = evaluation for sum over all states corresponding to one cell
 
         # change in initialise in case you want to start out with something else
@@ -43,8 +48,10 @@ class Localizer:
         x, y, h = self.__sm.state_to_pose(self.__trueState)
         return x, y, h
 
-    # the current probability distribution over all states
+    # the current probability distribution over all states (only built when it is asked for)
     def get_current_f_vector(self) -> np.array(float):
+        if self.__fVec is None:
+            self.__fVec = self.__filter.get_beliefs()
         return self.__fVec
 
     # the current sensor reading (as position in the grid). "Nothing" is expressed as None
@@ -58,18 +65,38 @@ class Localizer:
     def most_likely_position(self) -> (int, int):
         return self.__estimate
 
+    # log-likelihood of all readings since the last initialise (robust mode or particle filter)
+    def get_log_likelihood(self) -> float:
+        return self.__filter.get_log_likelihood()
+
+    # log-likelihood of the current reading given all earlier ones (robust mode or particle filter)
+    def get_step_log_likelihood(self) -> float:
+        return self.__filter.get_step_log_likelihood()
+
+    # Manhattan error, hit rate and error percentiles of all steps since the last initialise
+    def get_metrics(self) -> LocalizationMetrics:
+        return self.__metrics
+
+    # the filter itself, e.g. for the active set size and truncation error of the HMMFilter
+    def get_filter(self):
+        return self.__filter
+
     ################################### Here you need to really fill in stuff! ##################################
     # if you want to start with something else, change the initialisation here!
     #
     # (re-)initialise for a new run without change of size
     def initialise(self):
-        self.__trueState = random.randint(0, self.__sm.get_num_of_states() - 1)
+        self.__trueState = random.choice(np.flatnonzero(self.__sm.get_free_states()).tolist())
         self.__sense = None
-        self.__fVec = np.ones(self.__sm.get_num_of_states()) / (self.__sm.get_num_of_states())
+        self.__fVec = self.__sm.get_uniform_belief()
         self.__estimate = self.__sm.state_to_position(np.argmax(self.__fVec))
+        self.__metrics = LocalizationMetrics(self.__sm)
     
         self.__rs = RobotSimAndFilter.RobotSim(self.__sm, self.__tm, self.__om)
-        self.__HMM = RobotSimAndFilter.HMMFilter(self.__sm, self.__tm, self.__om)
+        if self.num_particles:
+            self.__filter = RobotSimAndFilter.ParticleFilter(self.__sm, self.__tm, self.__om, self.num_particles)
+        else:
+            self.__filter = RobotSimAndFilter.HMMFilter(self.__sm, self.__tm, self.__om, self.robust, self.threshold, self.top_k)
         
     #
     #  Implement the update cycle:
@@ -92,6 +119,13 @@ class Localizer:
     #  - AND the new probability distribution
     #
     def update(self) -> (bool, int, int, int, int, int, int, int, int, np.array(1)) :
+        # if you use the visualisation (dashboard), this return statement needs to be kept the same
+        # or the visualisation needs to be adapted (your own risk!)
+        return (*self.step(), self.get_current_f_vector())
+
+    # the same as update without the probability distribution, which is then not built over all
+    # states by the active set and particle filters
+    def step(self) -> (bool, int, int, int, int, int, int, int, int):
         # update all the values to something sensible instead of just reading the old values...
         # 
 
@@ -108,18 +142,60 @@ class Localizer:
             ret = True
         
         # update the probability distribution
-        self.__estimate = np.argmax(self.__HMM.update(self.__sense, self.version))
+        self.__estimate = self.__filter.update(self.__sense, self.version)
+        self.__fVec = None
         eX, eY = self.__sm.state_to_position(self.__estimate)
         
         # this should be updated to spit out the actual error for this step
         error = self.ManhattanDistance(self.__trueState, self.__estimate)    
+        self.__metrics.add_errors(error)
         
-        # if you use the visualisation (dashboard), this return statement needs to be kept the same
-        # or the visualisation needs to be adapted (your own risk!)
-        return ret, tsX, tsY, tsH, srX, srY, eX, eY, error, self.__fVec
-
+        return ret, tsX, tsY, tsH, srX, srY, eX, eY, error
+
+
+    # Replay mode: runs the filter on recorded readings instead of the simulated robot, e.g. from
+    # SensorLog.iter_log(path, rows, cols). records is any iterable of readings or of (reading, true
+    # state) pairs, with None for "nothing" / unknown true state. Nothing is stored, per step this yields
+    # (estimated x, estimated y, error or None if the true state is unknown, filter latency in seconds)
+    # and the errors are added to the metrics (see get_metrics). A reading or true state outside the
+    # grid raises a ValueError
+    def replay(self, records):
+        for record in records:
+            yield self.__replay_step(record)
+
+    # replay a sensor log file, which must have been recorded on a grid of the same size
+    def replay_log(self, path):
+        rows, cols, _ = self.__sm.get_grid_dimensions()
+        return self.replay(SensorLog.iter_log(path, rows, cols))
+
+    # the same for an async iterable, e.g. SensorLog.aiter_stream(reader)
+    async def replay_async(self, records):
+        async for record in records:
+            yield self.__replay_step(record)
+
+    def __replay_step(self, record):
+        reading, true_state = record if isinstance(record, tuple) else (record, None)
+        if reading is not None and not 0 <= reading < self.__sm.get_num_of_readings() - 1:
+            raise ValueError("reading {} is not a position of the grid".format(reading))
+        if true_state is not None and not 0 <= true_state < self.__sm.get_num_of_states():
+            raise ValueError("true state {} is not a state of the grid".format(true_state))
+
+        start = time.perf_counter()
+        self.__sense = reading
+        self.__estimate = self.__filter.update(reading, self.version)
+        self.__fVec = None
+        latency = time.perf_counter() - start
 
+        eX, eY = self.__sm.state_to_position(self.__estimate)
+        error = None
+        if true_state is not None:
+            self.__trueState = true_state
+            error = self.ManhattanDistance(true_state, self.__estimate)
+            self.__metrics.add_errors(error)
+        return eX, eY, error, latency
+
+    # works for single states as well as for arrays of states
     def ManhattanDistance(self, trueState, estimate):
-        truePosition = self.__sm.state_to_position(trueState)
-        estimatedPosition = self.__sm.state_to_position(estimate)
-        return abs(truePosition[0] - estimatedPosition[0]) + abs(truePosition[1] - estimatedPosition[1])
\ No newline at end of file
+        trueX, trueY = self.__sm.states_to_positions(trueState)
+        estimatedX, estimatedY = self.__sm.states_to_positions(estimate)
+        return np.abs(trueX - estimatedX) + np.abs(trueY - estimatedY)
\ No newline at end of file
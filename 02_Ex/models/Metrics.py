@@ -0,0 +1,72 @@
+#
+# Accumulator for the evaluation of a localisation run: Manhattan error between the true and the
+# estimated position, hit rate (error == 0), error histogram and percentiles.
+#
+# Errors are integers between 0 and rows + cols - 2, so the histogram over all of them is all that is
+# kept: memory does not grow with the number of steps, and the mean, hit rate and percentiles follow
+# exactly from the histogram. Steps can be added one at a time or as whole arrays (e.g. the decoded
+# states of a trajectory).
+#
+
+import numpy as np
+
+
+class LocalizationMetrics:
+    def __init__(self, sm):
+        self.__sm = sm
+        rows, cols, _ = sm.get_grid_dimensions()
+        self.__histogram = np.zeros(rows + cols - 1, dtype=np.int64)
+        self.__total_error = 0
+
+    def reset(self):
+        self.__histogram[:] = 0
+        self.__total_error = 0
+
+    # true and estimated states, single states or arrays of them
+    def add(self, true_states, estimates):
+        true_x, true_y = self.__sm.states_to_positions(true_states)
+        estimated_x, estimated_y = self.__sm.states_to_positions(estimates)
+        self.add_errors(np.abs(true_x - estimated_x) + np.abs(true_y - estimated_y))
+
+    # Manhattan errors that are already known, a single error or an array of them
+    def add_errors(self, errors):
+        errors = np.asarray(errors, dtype=np.int64).ravel()
+        self.__histogram += np.bincount(errors, minlength=self.__histogram.size)
+        self.__total_error += int(np.sum(errors))
+
+    def get_num_of_steps(self) -> int:
+        return int(np.sum(self.__histogram))
+
+    def get_total_error(self) -> int:
+        return self.__total_error
+
+    def get_mean_error(self) -> float:
+        n = self.get_num_of_steps()
+        return self.__total_error / n if n else float("nan")
+
+    def get_num_of_hits(self) -> int:
+        return int(self.__histogram[0])
+
+    def get_hit_rate(self) -> float:
+        n = self.get_num_of_steps()
+        return self.get_num_of_hits() / n if n else float("nan")
+
+    # number of steps per error 0, 1, ..., rows + cols - 2
+    def get_histogram(self) -> np.array(1):
+        return self.__histogram.copy()
+
+    # smallest error such that at least q percent of the steps have at most that error
+    def get_percentile(self, q) -> int:
+        return int(self.get_percentiles([q])[0])
+
+    def get_percentiles(self, qs) -> np.array(1):
+        n = self.get_num_of_steps()
+        if n == 0:
+            return np.full(len(qs), -1)
+        cumulative = np.cumsum(self.__histogram)
+        return np.searchsorted(cumulative, np.ceil(np.asarray(qs, dtype=float) / 100.0 * n).clip(1, n))
+
+    def summary(self) -> dict:
+        median, p90 = self.get_percentiles([50, 90])
+        return {"steps": self.get_num_of_steps(), "avg_error": self.get_mean_error(), "hit_rate": self.get_hit_rate(),
+                "median_error": int(median), "p90_error": int(p90)}
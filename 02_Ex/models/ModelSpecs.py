@@ -0,0 +1,87 @@
+#
+# Declarative descriptions of the sensor, the motion policy and the room, from which the
+# ObservationModel and TransitionModel compile their (sparse) tables once.
+#
+# SensorSpec:   ring_probs[d] is the probability to report a position at Chebyshev distance d from
+#               the true position, the rest is "nothing". The default is the 0.1 / 0.05 / 0.025 sensor.
+# MotionSpec:   keep_heading is the probability to keep the heading if the next cell in that direction
+#               can be entered; the rest is split evenly over the other free directions. If the way
+#               ahead is blocked, the robot turns to one of the free directions uniformly. The default
+#               0.7 reproduces the wall-bouncing policy of the assignment.
+# ObstacleMap:  blocked cells and interior walls between two neighbouring cells. The outer walls of
+#               the grid are always there.
+#
+
+import numpy as np
+
+# change of x and y when stepping in direction h (0 = SOUTH, 1 = EAST, 2 = NORTH, 3 = WEST)
+STEP_X = [1, 0, -1, 0]
+STEP_Y = [0, 1, 0, -1]
+
+
+class SensorSpec:
+    def __init__(self, ring_probs=(0.1, 0.05, 0.025)):
+        self.ring_probs = tuple(float(p) for p in ring_probs)
+
+        # an inner cell has 1 position at distance 0 and 8 * d positions at distance d
+        total = sum(p * (8 * d if d > 0 else 1) for d, p in enumerate(self.ring_probs))
+        if min(self.ring_probs) < 0.0 or total > 1.0 + 1e-12:
+            raise ValueError("ring probabilities {} do not give a valid distribution".format(self.ring_probs))
+
+    # the largest distance at which a position can be reported
+    def get_radius(self) -> int:
+        return len(self.ring_probs) - 1
+
+
+class MotionSpec:
+    def __init__(self, keep_heading=0.7):
+        if not 0.0 <= keep_heading <= 1.0:
+            raise ValueError("keep_heading must be a probability, got {}".format(keep_heading))
+        self.keep_heading = float(keep_heading)
+
+
+class ObstacleMap:
+    # blocked: cells (x, y) the robot can not enter, walls: pairs ((x1, y1), (x2, y2)) of neighbouring
+    # cells with a wall between them
+    def __init__(self, rows, cols, blocked=(), walls=()):
+        self.rows = rows
+        self.cols = cols
+
+        self.__blocked = np.zeros(shape=(rows, cols), dtype=bool)
+        for x, y in blocked:
+            self.__blocked[x, y] = True
+
+        self.__walls = []
+        for (x1, y1), (x2, y2) in walls:
+            if abs(x1 - x2) + abs(y1 - y2) != 1:
+                raise ValueError("a wall must be between two neighbouring cells, got {} and {}".format((x1, y1), (x2, y2)))
+            self.__walls.append(((x1, y1), (x2, y2)))
+
+    # map from lines of text, "#" is a blocked cell, any other character a free one
+    @classmethod
+    def from_string(cls, text, walls=()):
+        lines = [line.strip() for line in text.strip().splitlines()]
+        blocked = [(x, y) for x, line in enumerate(lines) for y, c in enumerate(line) if c == "#"]
+        return cls(len(lines), len(lines[0]), blocked, walls)
+
+    # free[x, y] is True if the cell can be entered
+    def get_free_cells(self) -> np.array(2):
+        return ~self.__blocked
+
+    # moves[x, y, h] is True if the robot can step from (x, y) in direction h
+    def get_free_moves(self) -> np.array(3):
+        free = ~self.__blocked
+        x, y = np.meshgrid(np.arange(self.rows), np.arange(self.cols), indexing="ij")
+
+        moves = np.zeros(shape=(self.rows, self.cols, 4), dtype=bool)
+        for h in range(4):
+            nx = x + STEP_X[h]
+            ny = y + STEP_Y[h]
+            inside = (nx >= 0) & (nx < self.rows) & (ny >= 0) & (ny < self.cols)
+            moves[:, :, h] = free & inside & free[np.clip(nx, 0, self.rows - 1), np.clip(ny, 0, self.cols - 1)]
+
+        for (x1, y1), (x2, y2) in self.__walls:
+            h = [h for h in range(4) if x1 + STEP_X[h] == x2 and y1 + STEP_Y[h] == y2][0]
+            moves[x1, y1, h] = False
+            moves[x2, y2, (h + 2) % 4] = False
+        return moves
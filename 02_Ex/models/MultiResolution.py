@@ -0,0 +1,225 @@
+#
+# Multiresolution localisation for rooms that are too large for filtering over all states.
+#
+# The room is a fine grid of (rows * factor) x (cols * factor) cells, the robot moves and the sensor
+# reports positions on that grid. Every factor x factor block of fine cells is one cell of a coarse
+# grid of rows x cols cells, with its own tables derived from the fine ones:
+#
+# - coarse sensor: the probability to report a position in coarse cell r when in coarse cell c is
+#   the fine sensor's probability mass falling into block r, averaged over the fine cells of block c
+#   (and over the cells of a Chebyshev ring, so that it is again a SensorSpec)
+# - coarse motion: in one (fine) step the robot leaves its block with probability 1 / factor, in
+#   which case it moves to a neighbouring block by the (coarse) MotionSpec, otherwise it stays
+# - a coarse cell is blocked if all of its fine cells are
+#
+# The coarse filter always runs over all coarse states, the fine filter only over an active set of
+# fine states. Whenever the fine filter has lost the robot (the reading has probability 0 under its
+# active set, or the coarse filter puts almost no mass on the blocks of the active set), the active
+# set is refined again from the coarse belief: the most probable coarse states covering refine_mass
+# of the belief are split into their fine states. A step therefore costs about the coarse filter
+# plus the (small) active set, most steps do not touch the other fine states at all.
+#
+
+import random
+
+import numpy as np
+
+from models.ModelSpecs import SensorSpec, ObstacleMap
+from models.StateModel import StateModel
+from models.TransitionModel import TransitionModel
+from models.ObservationModel import ObservationModel
+from models.Metrics import LocalizationMetrics
+from models.RobotSimAndFilter import RobotSim
+
+
+# the coarse sensor of a fine sensor spec, see above
+def coarse_sensor_spec(spec, factor) -> SensorSpec:
+    radius = spec.get_radius()
+    ring_probs = np.array(spec.ring_probs)
+
+    # fine offsets of the readings around a cell and their probabilities
+    dx, dy = np.meshgrid(np.arange(-radius, radius + 1), np.arange(-radius, radius + 1), indexing="ij")
+    probs = ring_probs[np.maximum(np.abs(dx), np.abs(dy))].ravel()
+
+    # coarse offset of every reading, from every fine cell of a block
+    ux, uy = np.meshgrid(np.arange(factor), np.arange(factor), indexing="ij")
+    cx = (ux.ravel()[:, None] + dx.ravel()[None, :]) // factor
+    cy = (uy.ravel()[:, None] + dy.ravel()[None, :]) // factor
+    ring = np.maximum(np.abs(cx), np.abs(cy))
+
+    mass = np.bincount(ring.ravel(), weights=np.broadcast_to(probs, ring.shape).ravel()) / factor ** 2
+    cells = np.array([1] + [8 * d for d in range(1, mass.size)])
+    return SensorSpec(mass / cells)
+
+
+# the coarse obstacle map of a fine one, a block is blocked if all of its cells are
+def coarse_obstacle_map(obstacles, factor) -> ObstacleMap:
+    rows, cols = obstacles.rows // factor, obstacles.cols // factor
+    free = obstacles.get_free_cells()[:rows * factor, :cols * factor].reshape(rows, factor, cols, factor)
+    blocked = np.argwhere(~free.any(axis=(1, 3)))
+    return ObstacleMap(rows, cols, [tuple(b) for b in blocked])
+
+
+class MultiResolutionFilter:
+    # threshold / top_k prune the fine active set after every step (as in HMMFilter), refine_mass is the
+    # part of the coarse belief that is refined, min_support the coarse mass on the blocks of the fine
+    # active set below which the fine filter is considered lost
+    def __init__(self, coarse_sm, fine_sm, motion=None, sensor=None, threshold=1e-4, top_k=None,
+                 refine_mass=0.99, min_support=1e-3):
+        coarse_rows, _, _ = coarse_sm.get_grid_dimensions()
+        fine_rows, _, _ = fine_sm.get_grid_dimensions()
+        self.__factor = fine_rows // coarse_rows
+        self.__coarse_sm = coarse_sm
+        self.__fine_sm = fine_sm
+
+        self.__coarse_tm = TransitionModel(coarse_sm, motion)
+        self.__coarse_om = ObservationModel(coarse_sm, coarse_sensor_spec(sensor or SensorSpec(), self.__factor))
+        self.__fine_tm = TransitionModel(fine_sm, motion)
+        self.__fine_om = ObservationModel(fine_sm, sensor)
+        self.__leave = 1.0 / self.__factor # probability to leave the block in one step
+
+        self.__threshold = threshold
+        self.__top_k = top_k
+        self.__refine_mass = refine_mass
+        self.__min_support = min_support
+        self.initialise()
+
+    def initialise(self):
+        self.__coarse_beliefs = self.__coarse_sm.get_uniform_belief()
+        self.__active = None # fine active set and its beliefs, None until the first refinement
+        self.__active_beliefs = None
+        self.__num_of_refinements = 0
+
+    def get_fine_models(self) -> (TransitionModel, ObservationModel):
+        return self.__fine_tm, self.__fine_om
+
+    def __coarse_reading(self, reading):
+        if reading is None:
+            return None
+        x, y = self.__fine_sm.reading_to_position(reading)
+        return self.__coarse_sm.position_to_reading(x // self.__factor, y // self.__factor)
+
+    def __coarse_update(self, reading):
+        predicted = (1.0 - self.__leave) * self.__coarse_beliefs + self.__leave * self.__coarse_tm.propagate(self.__coarse_beliefs)
+        o = self.__coarse_om.get_o_reading_state_probs(self.__coarse_reading(reading))
+        updated = o * predicted
+        c = np.sum(updated)
+        self.__coarse_beliefs = updated / c if c > 0.0 else o / np.sum(o)
+
+    # the fine states of the most probable coarse states, weighted with the reading
+    def __refine(self, reading):
+        order = np.argsort(-self.__coarse_beliefs)
+        k = np.searchsorted(np.cumsum(self.__coarse_beliefs[order]), self.__refine_mass) + 1
+        chosen = order[:k]
+        cx, cy, ch = self.__coarse_sm.states_to_poses(chosen)
+
+        f = self.__factor
+        ox, oy = np.meshgrid(np.arange(f), np.arange(f), indexing="ij")
+        fx = cx[:, None] * f + ox.ravel()[None, :]
+        fy = cy[:, None] * f + oy.ravel()[None, :]
+        states = self.__fine_sm.poses_to_states(fx, fy, ch[:, None]).ravel()
+        prior = np.repeat(self.__coarse_beliefs[chosen], f * f)
+
+        beliefs = prior * self.__fine_om.get_o_reading_state(reading, states)
+        if np.sum(beliefs) <= 0.0:
+            beliefs = prior * self.__fine_sm.get_free_states()[states]
+        self.__num_of_refinements += 1
+        self.__select_active_set(states, beliefs)
+
+    def __select_active_set(self, states, beliefs):
+        keep = beliefs > 0.0
+        if self.__threshold:
+            keep &= beliefs >= self.__threshold * np.sum(beliefs)
+            keep[np.argmax(beliefs)] = True # a spread-out belief can be below the threshold everywhere
+        if self.__top_k and np.count_nonzero(keep) > self.__top_k:
+            keep = np.zeros(states.size, dtype=bool)
+            keep[np.argpartition(beliefs, -self.__top_k)[-self.__top_k:]] = True
+        self.__active = states[keep]
+        self.__active_beliefs = beliefs[keep] / np.sum(beliefs[keep])
+
+    # coarse probability of the blocks the fine active set is in
+    def __support(self) -> float:
+        x, y = self.__fine_sm.states_to_positions(self.__active)
+        blocks = np.unique(self.__coarse_sm.positions_to_readings(x // self.__factor, y // self.__factor))
+        return np.sum(self.__coarse_beliefs.reshape(-1, 4)[blocks])
+
+    # one step with the fine reading (None for "nothing"), returns the most probable fine state
+    def update(self, reading) -> int:
+        self.__coarse_update(reading)
+
+        if self.__active is None:
+            self.__refine(reading)
+        else:
+            # propagate only from the active set, summing up the mass arriving in every successor
+            succ, succ_probs = self.__fine_tm.get_successors()
+            mass = (succ_probs[self.__active] * self.__active_beliefs[:, None]).ravel()
+            reached = mass > 0.0
+            targets, inverse = np.unique(succ[self.__active].ravel()[reached], return_inverse=True)
+            updated = np.bincount(inverse, weights=mass[reached]) * self.__fine_om.get_o_reading_state(reading, targets)
+            if np.sum(updated) > 0.0:
+                self.__select_active_set(targets, updated)
+            if np.sum(updated) <= 0.0 or self.__support() < self.__min_support:
+                self.__refine(reading)
+
+        return int(self.__active[np.argmax(self.__active_beliefs)])
+
+    # the fine active set and its beliefs (all other fine states have probability 0)
+    def get_fine_belief(self) -> (np.array(1), np.array(1)):
+        return self.__active, self.__active_beliefs
+
+    def get_coarse_belief(self) -> np.array(1):
+        return self.__coarse_beliefs
+
+    def get_active_set_size(self) -> int:
+        return 0 if self.__active is None else self.__active.size
+
+    # number of times the fine active set was (re-)built from the coarse belief
+    def get_num_of_refinements(self) -> int:
+        return self.__num_of_refinements
+
+
+# Localizer on a fine grid of (rows * factor) x (cols * factor) cells, filtering with a
+# MultiResolutionFilter. update() returns the same values as Localizer.update, with all positions on
+# the fine grid, but the distribution is the coarse belief (over the rows x cols grid), since the
+# fine one is only known on the active set (see get_filter().get_fine_belief()).
+class MultiResolutionLocalizer:
+    def __init__(self, rows, cols, factor, obstacles=None, motion=None, sensor=None, **filter_options):
+        self.__fine_sm = StateModel(rows * factor, cols * factor, obstacles)
+        self.__coarse_sm = StateModel(rows, cols, coarse_obstacle_map(self.__fine_sm.get_obstacle_map(), factor))
+        self.__filter = MultiResolutionFilter(self.__coarse_sm, self.__fine_sm, motion, sensor, **filter_options)
+        tm, om = self.__filter.get_fine_models()
+        self.__rs = RobotSim(self.__fine_sm, tm, om)
+        self.initialise()
+
+    def initialise(self):
+        self.__trueState = random.choice(np.flatnonzero(self.__fine_sm.get_free_states()).tolist())
+        self.__sense = None
+        self.__filter.initialise()
+        self.__metrics = LocalizationMetrics(self.__fine_sm)
+
+    def get_fine_state_model(self) -> StateModel:
+        return self.__fine_sm
+
+    def get_coarse_state_model(self) -> StateModel:
+        return self.__coarse_sm
+
+    def get_filter(self) -> MultiResolutionFilter:
+        return self.__filter
+
+    def get_metrics(self) -> LocalizationMetrics:
+        return self.__metrics
+
+    def get_current_true_pose(self) -> (int, int, int):
+        return self.__fine_sm.state_to_pose(self.__trueState)
+
+    def update(self) -> (bool, int, int, int, int, int, int, int, int, np.array(1)):
+        self.__trueState, self.__sense = self.__rs.step(self.__trueState)
+        tsX, tsY, tsH = self.__fine_sm.state_to_pose(self.__trueState)
+        srX, srY = (-1, -1) if self.__sense is None else self.__fine_sm.reading_to_position(self.__sense)
+
+        estimate = self.__filter.update(self.__sense)
+        eX, eY = self.__fine_sm.state_to_position(estimate)
+        error = abs(tsX - eX) + abs(tsY - eY)
+        self.__metrics.add_errors(error)
+
+        return self.__sense is not None, tsX, tsY, tsH, srX, srY, eX, eY, error, self.__filter.get_coarse_belief()
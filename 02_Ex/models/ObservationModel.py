@@ -2,92 +2,106 @@
 # matrices for each possible sensor reading r
 # The last of these vectors contains the probabilities for the sensor to produce nothing ("None")
 #
-# The implementation follows the description directly, i.e.
+# The implementation follows the description, generalised by a SensorSpec (see ModelSpecs), i.e.
 # 
 # the probability for
 # - reporting reading r when in any of the four states (poses) i belonging to position "r" is 0.1
 # - reporting r when actually in any of the four states (poses) i belonging to any of the 
-#    n_Ls ∈ {3, 5, 8} existing surrounding fields Ls of r is 0.05 
+#    n_Ls ∈ {3, 5, 8} existing surrounding fields Ls of r is 0.05 
 # - reporting r when actually in any of the four states (poses) i belonging to any of the 
-#    n_Ls2 ∈ {5, 6, 7, 9, 11, 16} existing “secondary” surrounding fields Ls2 of r is 0.025 
+#    n_Ls2 ∈ {5, 6, 7, 9, 11, 16} existing “secondary” surrounding fields Ls2 of r is 0.025 
 # - reporting "nothing" (None) is 1.0 - 0.1 - n_Ls*0.05 - n_Ls2*0.025 for ALL states i 
 #
-# 
+# with the default ring probabilities 0.1, 0.05, 0.025 for the Chebyshev distances 0, 1 and 2.
+#
+# A state can only produce the readings of the (2 * radius + 1)^2 positions around it, so instead of
+# the (rows * cols + 1) x nr_of_states matrix of all vectors, only these are stored: the positions
+# around every position and their probabilities (the same for both directions, since the distance is
+# symmetric), and the vector for "nothing". The vector of a reading is built from them on demand.
+# States in blocked cells get probability 0 for all readings, so that no belief is put there.
+#
 
 import numpy as np
-import matplotlib.pyplot as plt
-import random
 
-import models.StateModel
+from models.ModelSpecs import SensorSpec
 
 class ObservationModel:
-    def __init__(self, stateModel):
+    def __init__(self, stateModel, spec=None):
 
         self.__stateModel = stateModel
         self.__rows, self.__cols, self.__head = stateModel.get_grid_dimensions()
+        self.__spec = spec if spec is not None else SensorSpec()
 
         self.__dim = self.__rows * self.__cols * self.__head
         self.__num_readings = self.__rows * self.__cols + 1
 
-        self.__vectors = np.ones(shape=(self.__num_readings, self.__dim))
-
-        for o in range(self.__num_readings - 1):
-            sx, sy = self.__stateModel.reading_to_position(o)
-
-            for i in range(self.__dim):
-                x, y = self.__stateModel.state_to_position(i)
-                self.__vectors[o, i] = 0.0
-
-                if x == sx and y == sy:
-                    # "correct" reading 
-                    self.__vectors[o, i] = 0.1
-                elif (x == sx + 1 or x == sx - 1) and y == sy:
-                    # first ring, below or above
-                    self.__vectors[o, i] = 0.05
-                elif (x == sx + 1 or x == sx - 1) and (y == sy + 1 or y == sy - 1):
-                    # first ring, "corners"
-                    self.__vectors[o, i] = 0.05
-                elif x == sx and (y == sy + 1 or y == sy - 1):
-                    # first ring, left or right
-                    self.__vectors[o, i] = 0.05
-                elif (x == sx + 2 or x == sx - 2) and (y == sy or y == sy + 1 or y == sy - 1):
-                    # second ring, above / below / left / right
-                    self.__vectors[o, i] = 0.025
-                elif (x == sx + 2 or x == sx - 2) and (y == sy + 2 or y == sy - 2):
-                    # second ring, "corners"
-                    self.__vectors[o, i] = 0.025
-                elif (x == sx or x == sx + 1 or x == sx - 1) and (y == sy + 2 or y == sy - 2):
-                    # second ring, "horse" metric
-                    self.__vectors[o, i] = 0.025
-
-                self.__vectors[self.__num_readings - 1, i] -= self.__vectors[o, i];  # sensor reading "nothing"
+        # probability per Chebyshev distance, 0 beyond the radius
+        radius = self.__spec.get_radius()
+        self.__ring_probs = np.array(self.__spec.ring_probs + (0.0,))
+
+        # positions around every position (missing ones point to position 0 with probability 0)
+        dx, dy = np.meshgrid(np.arange(-radius, radius + 1), np.arange(-radius, radius + 1), indexing="ij")
+        dx, dy = dx.ravel(), dy.ravel()
+        px, py = self.__stateModel.readings_to_positions(np.arange(self.__num_readings - 1))
+        nx = px[:, None] + dx[None, :]
+        ny = py[:, None] + dy[None, :]
+        inside = (nx >= 0) & (nx < self.__rows) & (ny >= 0) & (ny < self.__cols)
+        self.__around = np.where(inside, self.__stateModel.positions_to_readings(nx, ny), 0)
+        self.__around_probs = np.where(inside, self.__ring_probs[np.maximum(np.abs(dx), np.abs(dy))][None, :], 0.0)
+
+        self.__free = self.__stateModel.get_free_states()
+        cells = self.__stateModel.get_state_readings()
+        self.__nothing = (1.0 - np.sum(self.__around_probs, axis=1))[cells] * self.__free  # sensor reading "nothing"
+        self.__nothing.flags.writeable = False
+
+    def __is_nothing(self, reading) -> bool:
+        return reading is None or reading == self.__num_readings - 1
 
     # get the number of possible sensor readings (rows * columns + 1)
     def get_nr_of_readings(self) -> int:
         return self.__num_readings
 
     # get the probability for the sensor to have produced reading "reading" when in state "state"
+    # (i can also be an array of states)
     def get_o_reading_state(self, reading: int, i: int) -> float:
-        if reading == None : reading = self.__num_readings-1
-        return self.__vectors[reading, i]
+        if self.__is_nothing(reading):
+            return self.__nothing[i]
+        x, y = self.__stateModel.states_to_positions(i)
+        rx, ry = self.__stateModel.reading_to_position(reading)
+        ring = np.minimum(np.maximum(np.abs(x - rx), np.abs(y - ry)), self.__ring_probs.size - 1)
+        return self.__ring_probs[ring] * self.__free[i]
 
     # get the diagonale matrix O_reading with probabilities of the states i, i=0...nrOfStates-1 
     # to have produced reading "reading", returns a 2d-float array
     # use None for "no reading"
     def get_o_reading(self, reading: int) -> np.array(2):
-        if (reading == None): reading = self.__num_readings - 1
-        return np.diag( self.__vectors[reading, :])
+        return np.diag(self.get_o_reading_state_probs(reading))
 
     # plot the vectors as heat map(s)
     def plot_o_diags(self):
-        plt.matshow(self.__vectors)
+        import matplotlib.pyplot as plt  # only needed for plotting, the model itself works without it
+        plt.matshow([self.get_o_reading_state_probs(r) for r in range(self.__num_readings)])
         plt.colorbar()
         plt.show()
 
     # get probabilities for readings for a given state
     def get_o_reading_for_state(self, i: int) -> np.array(1):
-        return self.__vectors[:, i]
-
-    def get_o_reading_state_probs(self, reading: int) -> np.array(2):
-        if (reading == None): reading = self.__num_readings - 1
-        return self.__vectors[reading, :]
+        readings, probs = self.get_o_readings_for_state(i)
+        vector = np.zeros(self.__num_readings)
+        np.add.at(vector, readings, probs)
+        return vector
+
+    # the possible readings of a state and their probabilities, "nothing" (the last reading) included
+    def get_o_readings_for_state(self, i: int) -> (np.array(1), np.array(1)):
+        cell = self.__stateModel.state_to_reading(i)
+        readings = np.append(self.__around[cell], self.__num_readings - 1)
+        probs = np.append(self.__around_probs[cell] * self.__free[i], self.__nothing[i])
+        return readings, probs
+
+    def get_o_reading_state_probs(self, reading: int) -> np.array(1):
+        if self.__is_nothing(reading):
+            return self.__nothing
+        vector = np.zeros(self.__dim)
+        states = self.__around[reading][:, None] * self.__head + np.arange(self.__head)[None, :]
+        np.add.at(vector, states, np.broadcast_to(self.__around_probs[reading][:, None], states.shape))
+        return vector * self.__free
@@ -11,17 +11,15 @@ class RobotSim:
         self.__om = om # observation model
     
     def step(self, current_state):
-        # get the transition probability matrix
-        T = self.__tm.get_T()
-        # get probabilities for successor states
-        pT = T[current_state, :]
+        # get the successor states and their probabilities
+        succ, succ_probs = self.__tm.get_successors()
         # sample a successor state
-        next_state = np.random.choice(self.__sm.get_num_of_states(), p=pT) # sample with right probabilities
+        next_state = succ[current_state, np.random.choice(succ.shape[1], p=succ_probs[current_state])] # sample with right probabilities
 
-        # get the observation probability vector
-        pO = self.__om.get_o_reading_for_state(next_state)
+        # get the possible observations and their probabilities
+        readings, pO = self.__om.get_o_readings_for_state(next_state)
         # sample an observation
-        sense = np.random.choice(self.__om.get_nr_of_readings(), p=pO)
+        sense = readings[np.random.choice(readings.size, p=pO)]
         if sense == self.__om.get_nr_of_readings() - 1:
             sense = None
 
@@ -29,17 +27,64 @@ class RobotSim:
         return next_state, sense
         
 class HMMFilter:
-    def __init__(self, sm, tm, om):
+    # with robust=True the filter normalises the predicted belief in every step, keeps the
+    # normalisers c_t = P(o_t | o_1:t-1) as log-likelihoods and recovers from readings that are
+    # impossible under the current belief (all-zero update) instead of producing NaNs.
+    #
+    # With a threshold and/or top_k the filter works on an active set (versions 0 and 1): only states
+    # with at least threshold probability / the top_k states are kept and propagated through the
+    # successor tables, the dropped mass is the approximation error of the step. As long as the active
+    # set is larger than dense_fraction of all states, the dense (robust) update is used instead. An
+    # active set update only knows the belief of the states reached from the active set, get_beliefs
+    # builds the vector over all states when it is asked for.
+    def __init__(self, sm, tm, om, robust=False, threshold=None, top_k=None, dense_fraction=0.25):
         self.__sm = sm # state model
         self.__tm = tm # transition model
         self.__om = om # observation model
-        self.__beliefs = np.ones(self.__sm.get_num_of_states()) / (self.__sm.get_num_of_states())
+        self.__robust = robust
+        self.__beliefs = self.__sm.get_uniform_belief() # None while only the sparse belief is known
+        self.__sparse = None # (states, beliefs) of the last active set update, all other states have probability 0
+        self.__step_log_likelihood = 0.0
+        self.__log_likelihood = 0.0
+        self.__num_of_resets = 0
+
+        self.__threshold = threshold
+        self.__top_k = top_k
+        self.__max_active = dense_fraction * self.__sm.get_num_of_states()
+        self.__active = None # active states, None while the dense update is used
+        self.__active_beliefs = None
+        self.__truncation_error = 0.0
+        self.__total_truncation_error = 0.0
     
+    # one step with the reading (None for "nothing"), returns the most probable state (the belief
+    # itself is returned by get_beliefs)
     def update(self, reading, version):
+        self.__sparse = None
+        if (self.__threshold or self.__top_k) and (version == 0 or version == 1):
+            self.__active_update(reading, version)
+        elif self.__robust and (version == 0 or version == 1):
+            self.__robust_update(reading, version)
+        else:
+            self.__dense_update(reading, version)
+
+        if self.__sparse is not None:
+            states, beliefs = self.__sparse
+            return int(states[np.argmax(beliefs)])
+        return int(np.argmax(self.__beliefs))
+
+    # the belief over all states after the last update
+    def get_beliefs(self) -> np.array(1):
+        if self.__beliefs is None:
+            states, beliefs = self.__sparse
+            self.__beliefs = np.zeros(self.__sm.get_num_of_states())
+            self.__beliefs[states] = beliefs
+        return self.__beliefs
+
+    def __dense_update(self, reading, version):
         if version == 0: # full filtering
-            self.__beliefs = self.__om.get_o_reading(reading) @ self.__tm.get_T_transp() @ self.__beliefs
+            self.__beliefs = self.__om.get_o_reading_state_probs(reading) * self.__tm.propagate(self.__beliefs)
         if version == 1: # no observation matrix
-            self.__beliefs = self.__tm.get_T_transp() @ self.__beliefs
+            self.__beliefs = self.__tm.propagate(self.__beliefs)
         if version == 2: # no transition matrix
             self.__beliefs = self.__om.get_o_reading_state_probs(reading)
         if version == 3: # pure guessing
@@ -49,10 +94,192 @@ class HMMFilter:
 
     
         self.__beliefs = self.__beliefs / np.sum(self.__beliefs)
-        
-        return self.__beliefs
-    
 
-        
-        
-        
+    def __robust_update(self, reading, version):
+        predicted = self.__tm.propagate(self.__beliefs)
+        predicted = predicted / np.sum(predicted)
+
+        o = self.__om.get_o_reading_state_probs(reading)
+        updated = o * predicted
+        c = np.sum(updated)
+
+        if c > 0.0 and np.isfinite(c):
+            self.__step_log_likelihood = np.log(c)
+            if version == 0:
+                self.__beliefs = updated / c
+            else: # no observation matrix, the likelihood is still tracked
+                self.__beliefs = predicted
+        else:
+            # the reading cannot be explained by the current belief, start over from the reading alone
+            self.__step_log_likelihood = -np.inf
+            self.__num_of_resets += 1
+            self.__beliefs = o / np.sum(o) if version == 0 else predicted
+
+        self.__log_likelihood += self.__step_log_likelihood
+
+    def __active_update(self, reading, version):
+        if self.__active is None:
+            self.__robust_update(reading, version)
+            idx = np.flatnonzero(self.__beliefs)
+            self.__select_active_set(idx, self.__beliefs[idx])
+            return
+
+        # propagate only from the active set, summing up the mass arriving in every successor
+        succ, succ_probs = self.__tm.get_successors()
+        mass = (succ_probs[self.__active] * self.__active_beliefs[:, None]).ravel()
+        reached = mass > 0.0
+        targets, inverse = np.unique(succ[self.__active].ravel()[reached], return_inverse=True)
+        predicted = np.bincount(inverse, weights=mass[reached])
+
+        updated = predicted * self.__om.get_o_reading_state(reading, targets)
+        c = np.sum(updated)
+        explained = c > 0.0 and np.isfinite(c)
+        if explained:
+            self.__step_log_likelihood = np.log(c / np.sum(predicted))
+        else:
+            self.__step_log_likelihood = -np.inf
+            self.__num_of_resets += 1
+
+        if version == 0 and not explained:
+            # the reading cannot be explained by the active set, start over from the reading alone (dense)
+            o = self.__om.get_o_reading_state_probs(reading)
+            self.__beliefs = o / np.sum(o)
+            idx = np.flatnonzero(self.__beliefs)
+            self.__select_active_set(idx, self.__beliefs[idx])
+        else:
+            if version == 0:
+                predicted = updated
+            # with no observation matrix the prediction is kept whatever the reading, as in __robust_update
+            self.__beliefs = None
+            self.__sparse = (targets, predicted / np.sum(predicted))
+            self.__select_active_set(*self.__sparse)
+            if self.__active is None: # back to the dense update, which needs the belief over all states
+                self.get_beliefs()
+
+        self.__log_likelihood += self.__step_log_likelihood
+
+    # keeps the states above the threshold / the top_k states as the active set for the next step,
+    # or switches back to the dense update if the belief is spread out too much
+    def __select_active_set(self, idx, beliefs):
+        keep = np.ones(idx.size, dtype=bool)
+        if self.__threshold:
+            keep = beliefs >= self.__threshold
+        if self.__top_k and np.count_nonzero(keep) > self.__top_k:
+            keep = np.zeros(idx.size, dtype=bool)
+            keep[np.argpartition(beliefs, -self.__top_k)[-self.__top_k:]] = True
+
+        kept = np.sum(beliefs[keep])
+        if np.count_nonzero(keep) > self.__max_active or kept <= 0.0:
+            self.__active = None
+            self.__truncation_error = 0.0
+            return
+
+        self.__active = idx[keep]
+        self.__active_beliefs = beliefs[keep] / kept
+        self.__truncation_error = 1.0 - kept / np.sum(beliefs)
+        self.__total_truncation_error += self.__truncation_error
+
+    # number of states the next update starts from (all states while the dense update is used)
+    def get_active_set_size(self) -> int:
+        return self.__sm.get_num_of_states() if self.__active is None else self.__active.size
+
+    # probability mass dropped from the belief when the active set was chosen in the last step
+    def get_truncation_error(self) -> float:
+        return self.__truncation_error
+
+    # sum of the dropped mass over all steps, an upper bound for the total approximation error
+    def get_total_truncation_error(self) -> float:
+        return self.__total_truncation_error
+
+    # log P(o_t | o_1, ..., o_t-1) of the last reading (robust mode, versions 0 and 1)
+    def get_step_log_likelihood(self) -> float:
+        return self.__step_log_likelihood
+
+    # log P(o_1, ..., o_t) of all readings so far (robust mode, versions 0 and 1)
+    def get_log_likelihood(self) -> float:
+        return self.__log_likelihood
+
+    # number of readings that had zero probability under the belief and forced a restart
+    def get_num_of_resets(self) -> int:
+        return self.__num_of_resets
+
+
+class ParticleFilter:
+    # approximates the belief with num_particles samples (states), for grids where carrying the
+    # exact belief over all states is too slow. update() and get_beliefs() have the same contract as
+    # in HMMFilter, the belief is the normalised histogram of the particles
+    def __init__(self, sm, tm, om, num_particles=1000):
+        self.__sm = sm # state model
+        self.__tm = tm # transition model
+        self.__om = om # observation model
+        self.__num_particles = num_particles
+
+        self.__succ, succ_probs = self.__tm.get_successors()
+        self.__succ_cum = np.cumsum(succ_probs, axis=1)
+        self.__particles = np.random.choice(self.__sm.get_num_of_states(), size=num_particles, p=self.__sm.get_uniform_belief())
+        self.__step_log_likelihood = 0.0
+        self.__log_likelihood = 0.0
+        self.__num_of_resets = 0
+
+    # move every particle to a successor, sampled through the cumulative successor probabilities
+    def __propagate(self):
+        u = np.random.random_sample(self.__num_particles)
+        k = np.sum(u[:, None] >= self.__succ_cum[self.__particles], axis=1)
+        k = np.minimum(k, self.__succ.shape[1] - 1)
+        self.__particles = self.__succ[self.__particles, k]
+
+    # systematic resampling: one random offset, num_particles evenly spaced pointers into the weights
+    def __resample(self, weights):
+        positions = (np.random.random_sample() + np.arange(self.__num_particles)) / self.__num_particles
+        cum = np.cumsum(weights)
+        idx = np.searchsorted(cum / cum[-1], positions)
+        self.__particles = self.__particles[np.minimum(idx, self.__num_particles - 1)]
+
+    def __weigh(self, reading):
+        weights = self.__om.get_o_reading_state(reading, self.__particles)
+        mean = np.mean(weights)
+        if mean > 0.0:
+            self.__step_log_likelihood = np.log(mean)
+            self.__resample(weights)
+        else:
+            # no particle explains the reading, draw new ones from the reading alone
+            self.__step_log_likelihood = -np.inf
+            self.__num_of_resets += 1
+            o = self.__om.get_o_reading_state_probs(reading)
+            self.__particles = np.random.choice(self.__sm.get_num_of_states(), size=self.__num_particles, p=o / np.sum(o))
+        self.__log_likelihood += self.__step_log_likelihood
+
+    def update(self, reading, version):
+        if version == 0: # full filtering
+            self.__propagate()
+            self.__weigh(reading)
+        if version == 1: # no observation matrix
+            self.__propagate()
+        if version == 2: # no transition matrix
+            o = self.__om.get_o_reading_state_probs(reading)
+            self.__particles = np.random.choice(self.__sm.get_num_of_states(), size=self.__num_particles, p=o / np.sum(o))
+        if version == 3: # pure guessing
+            self.__particles = np.full(self.__num_particles, random.randint(0, self.__sm.get_num_of_states() - 1))
+
+        # the most frequent particle, without a histogram over all states
+        states, counts = np.unique(self.__particles, return_counts=True)
+        return int(states[np.argmax(counts)])
+
+    # the particles as a normalised histogram over all states (built on every call)
+    def get_beliefs(self) -> np.array(1):
+        return np.bincount(self.__particles, minlength=self.__sm.get_num_of_states()) / self.__num_particles
+
+    def get_particles(self) -> np.array(1):
+        return self.__particles
+
+    # estimate of log P(o_t | o_1, ..., o_t-1), the log of the mean particle weight (version 0)
+    def get_step_log_likelihood(self) -> float:
+        return self.__step_log_likelihood
+
+    # estimate of log P(o_1, ..., o_t) (version 0)
+    def get_log_likelihood(self) -> float:
+        return self.__log_likelihood
+
+    # number of readings that no particle could explain and that forced a restart
+    def get_num_of_resets(self) -> int:
+        return self.__num_of_resets
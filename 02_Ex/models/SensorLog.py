@@ -0,0 +1,114 @@
+#
+# Binary sensor logs for replaying recorded runs through the Localizer (see Localizer.replay).
+#
+# A log is a 16 byte header followed by fixed size records:
+#
+#   header:  magic b"SLOG", format version, rows, cols         (4 x little endian uint32)
+#   record:  reading, true state                              (2 x little endian int32)
+#
+# The reading is the position index of the sensor reading (see StateModel), -1 for "nothing".
+# The true state is the state (pose) of the robot, -1 if it is not known. Since all records have
+# the same size, a log can be memory-mapped and replayed without reading it into memory.
+# The same records can be streamed over a socket, without the header.
+#
+
+import numpy as np
+
+MAGIC = b"SLOG"
+VERSION = 1
+HEADER = np.dtype([("magic", "S4"), ("version", "<u4"), ("rows", "<u4"), ("cols", "<u4")])
+RECORD = np.dtype([("reading", "<i4"), ("true_state", "<i4")])
+CHUNK = 65536 # records per read or write
+
+
+class SensorLogWriter:
+    def __init__(self, path, rows, cols):
+        self.__file = open(path, "wb")
+        self.__file.write(np.array([(MAGIC, VERSION, rows, cols)], dtype=HEADER).tobytes())
+        self.__buffer = np.empty(CHUNK, dtype=RECORD)
+        self.__n = 0
+
+    # reading None for "nothing", true_state None if not known
+    def write(self, reading, true_state=None):
+        self.__buffer[self.__n] = (-1 if reading is None else reading, -1 if true_state is None else true_state)
+        self.__n += 1
+        if self.__n == CHUNK:
+            self.flush()
+
+    def flush(self):
+        self.__file.write(self.__buffer[:self.__n].tobytes())
+        self.__n = 0
+
+    def close(self):
+        self.flush()
+        self.__file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+# write a whole log at once, readings and true states as arrays with -1 for "nothing" / unknown
+def write_log(path, rows, cols, readings, true_states=None):
+    records = np.empty(len(readings), dtype=RECORD)
+    records["reading"] = readings
+    records["true_state"] = -1 if true_states is None else true_states
+    with open(path, "wb") as f:
+        f.write(np.array([(MAGIC, VERSION, rows, cols)], dtype=HEADER).tobytes())
+        f.write(records.tobytes())
+
+
+# memory-map a log, returns the grid dimensions and the records as a read-only structured array
+def open_log(path) -> (int, int, np.ndarray):
+    header = np.fromfile(path, dtype=HEADER, count=1)
+    if header.size != 1 or header["magic"][0] != MAGIC:
+        raise ValueError("{} is not a sensor log".format(path))
+    if header["version"][0] != VERSION:
+        raise ValueError("unsupported sensor log version {}".format(header["version"][0]))
+    records = np.memmap(path, dtype=RECORD, mode="r", offset=HEADER.itemsize)
+    return int(header["rows"][0]), int(header["cols"][0]), records
+
+
+# (reading, true state) pairs of an array of records, with None for "nothing" / unknown
+def iter_records(records):
+    for start in range(0, len(records), CHUNK):
+        chunk = np.array(records[start:start + CHUNK]) # one chunk at a time in memory
+        for reading, true_state in zip(chunk["reading"].tolist(), chunk["true_state"].tolist()):
+            yield (None if reading < 0 else reading), (None if true_state < 0 else true_state)
+
+
+# (reading, true state) pairs of a log; with rows and cols, the log must be of a grid of that size
+def iter_log(path, rows=None, cols=None):
+    log_rows, log_cols, records = open_log(path)
+    if rows is not None and cols is not None and (log_rows, log_cols) != (rows, cols):
+        raise ValueError("{} is a log of a {}x{} grid, not of a {}x{} grid".format(path, log_rows, log_cols, rows, cols))
+    return iter_records(records)
+
+
+# (reading, true state) pairs from a connected socket sending records (no header), until it is closed
+def iter_socket(sock):
+    pending = b""
+    while True:
+        data = sock.recv(CHUNK * RECORD.itemsize)
+        if not data:
+            break
+        pending += data
+        n = len(pending) // RECORD.itemsize * RECORD.itemsize
+        yield from iter_records(np.frombuffer(pending[:n], dtype=RECORD))
+        pending = pending[n:]
+
+
+# the same for an asyncio.StreamReader, as an async generator
+async def aiter_stream(reader):
+    pending = b""
+    while True:
+        data = await reader.read(CHUNK * RECORD.itemsize)
+        if not data:
+            break
+        pending += data
+        n = len(pending) // RECORD.itemsize * RECORD.itemsize
+        for record in iter_records(np.frombuffer(pending[:n], dtype=RECORD)):
+            yield record
+        pending = pending[n:]
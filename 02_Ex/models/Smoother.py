@@ -0,0 +1,142 @@
+#
+# Smoothing for recorded trajectories: the estimate for step k uses readings after k as well.
+#
+# The FixedLagSmoother works online: after reading t it returns the smoothed belief for step t - lag,
+# keeping only the forward message of step t - lag and the last lag readings.
+#
+# The ForwardBackwardSmoother does a full forward-backward pass over a whole trajectory. Instead of
+# storing all T x S forward messages, it keeps one forward message every k steps (a checkpoint) and
+# recomputes the k messages of one segment at a time during the backward pass, so memory is
+# about (T / k + k) * S floats. With k = sqrt(T) a trajectory of 10^6 steps on a 50x50 grid needs
+# 2 * 1000 * 10000 floats, i.e. 160 MB, instead of 80 GB.
+#
+# Both use the sparse successor / predecessor tables of the TransitionModel, so one step costs O(S).
+# Step 0 is the state before the first move (uniform prior), reading t belongs to step t = 1, 2, ...
+#
+
+import math
+from array import array
+from collections import deque
+
+import numpy as np
+
+
+# index of the reading in the observation model, "nothing" (None) is the last one
+def _reading_index(om, reading) -> int:
+    return om.get_nr_of_readings() - 1 if reading is None else reading
+
+
+# one normalised filtering step, restarting from the reading alone if it cannot be explained
+def _forward(tm, om, f, reading) -> np.array(1):
+    o = om.get_o_reading_state_probs(reading)
+    f = o * tm.propagate(f)
+    c = np.sum(f)
+    if c > 0.0:
+        return f / c
+    return o / np.sum(o)
+
+
+# one normalised backward step, b_k = T @ (O_k+1 @ b_k+1)
+def _backward(tm, om, b, reading) -> np.array(1):
+    b = tm.back_propagate(om.get_o_reading_state_probs(reading) * b)
+    c = np.sum(b)
+    if c > 0.0:
+        return b / c
+    return np.ones(b.size) / b.size
+
+
+def _combine(f, b) -> np.array(1):
+    s = f * b
+    c = np.sum(s)
+    if c > 0.0:
+        return s / c
+    return f
+
+
+class FixedLagSmoother:
+    def __init__(self, sm, tm, om, lag):
+        self.__sm = sm # state model
+        self.__tm = tm # transition model
+        self.__om = om # observation model
+        self.__lag = lag
+        self.initialise()
+
+    def initialise(self):
+        self.__f = self.__sm.get_uniform_belief()
+        self.__readings = deque()
+        self.__t = 0
+
+    # smoothed belief for step k, given the forward message of step k and the readings of steps k+1 ... t
+    def __smoothed(self) -> np.array(1):
+        b = np.ones(self.__sm.get_num_of_states())
+        for reading in reversed(self.__readings):
+            b = _backward(self.__tm, self.__om, b, reading)
+        return _combine(self.__f, b)
+
+    # feed the reading of the next step, returns (k, smoothed belief of step k) with k = t - lag,
+    # or None as long as fewer than lag + 1 readings have been seen
+    def update(self, reading):
+        self.__t += 1
+        self.__readings.append(_reading_index(self.__om, reading))
+        if len(self.__readings) <= self.__lag:
+            return None
+
+        self.__f = _forward(self.__tm, self.__om, self.__f, self.__readings.popleft())
+        return self.__t - self.__lag, self.__smoothed()
+
+    # smoothed beliefs (k, belief) of the last lag steps at the end of a trajectory
+    def finish(self):
+        while self.__readings:
+            self.__f = _forward(self.__tm, self.__om, self.__f, self.__readings.popleft())
+            yield self.__t - len(self.__readings), self.__smoothed()
+
+
+class ForwardBackwardSmoother:
+    def __init__(self, sm, tm, om, checkpoint_every=None):
+        self.__sm = sm # state model
+        self.__tm = tm # transition model
+        self.__om = om # observation model
+        self.__k = checkpoint_every
+
+    # yields (t, smoothed belief of step t) for t = T, T-1, ..., 1 (note: in reverse order).
+    # readings can be any iterable (also a generator), it is consumed once.
+    def iter_smoothed(self, readings):
+        k = self.__k
+        if k is None:
+            k = max(1, math.isqrt(len(readings))) if hasattr(readings, "__len__") else 1000
+
+        # forward pass, keeping the readings compactly and one forward message every k steps
+        stored = array("i")
+        checkpoints = []
+        f = self.__sm.get_uniform_belief()
+        for reading in readings:
+            if len(stored) % k == 0:
+                checkpoints.append(f)
+            stored.append(_reading_index(self.__om, reading))
+            f = _forward(self.__tm, self.__om, f, stored[-1])
+
+        # backward pass, segment by segment from the end, recomputing the forward messages of the segment
+        n = len(stored)
+        b = np.ones(self.__sm.get_num_of_states())
+        segment = np.empty((min(k, n), self.__sm.get_num_of_states()))
+        for c in range(len(checkpoints) - 1, -1, -1):
+            first = c * k + 1 # first step of the segment
+            last = min((c + 1) * k, n)
+            f = checkpoints[c]
+            for t in range(first, last + 1):
+                f = _forward(self.__tm, self.__om, f, stored[t - 1])
+                segment[t - first] = f
+            for t in range(last, first - 1, -1):
+                yield t, _combine(segment[t - first], b)
+                b = _backward(self.__tm, self.__om, b, stored[t - 1])
+            checkpoints.pop()
+
+    # smoothed MAP states and positions of all steps 1 ... T, as arrays of shape (T,) and (T, 2)
+    def smooth(self, readings) -> (np.array(1), np.array(2)):
+        states = array("i")
+        for _, belief in self.iter_smoothed(readings):
+            states.append(int(np.argmax(belief)))
+        states = np.array(states[::-1], dtype=int)
+
+        positions = np.stack(self.__sm.states_to_positions(states), axis=1)
+        return states, positions
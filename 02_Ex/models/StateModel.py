@@ -15,20 +15,44 @@
 #
 # The encoding means that there will be numberOfRows*numberOfCols*4 states (poses) and numberOfRows*numberOfCols+1 
 # possible sensor readings (numberOfRows*numberOfCols positions + "none")
+#
+# An ObstacleMap (see ModelSpecs) can mark cells as blocked; their states still exist, but the robot
+# can never be there.
 
 import numpy as np
-import matplotlib.pyplot as plt
-import random
+
+from models.ModelSpecs import ObstacleMap
 
 class StateModel:
 
-    def __init__(self, rows, cols):
+    def __init__(self, rows, cols, obstacles=None):
         self.__rows = rows
         self.__cols = cols
         self.__head = 4
         self.__num_states = rows*cols*4
         self.__num_readings = rows*cols+1
 
+        # lookup arrays: pose (x, y, h) and reading of every state, position (x, y) of every reading
+        states = np.arange(self.__num_states)
+        self.__state_x = states // (self.__cols * self.__head)
+        self.__state_y = (states // self.__head) % self.__cols
+        self.__state_h = states % self.__head
+        self.__state_reading = states // self.__head
+        readings = np.arange(self.__num_readings - 1)
+        self.__reading_x = readings // self.__cols
+        self.__reading_y = readings % self.__cols
+
+        if obstacles is None:
+            obstacles = ObstacleMap(rows, cols)
+        elif (obstacles.rows, obstacles.cols) != (rows, cols):
+            raise ValueError("obstacle map is {}x{}, the grid {}x{}".format(obstacles.rows, obstacles.cols, rows, cols))
+        self.__obstacles = obstacles
+        self.__free_states = obstacles.get_free_cells()[self.__state_x, self.__state_y]
+
+        for a in (self.__state_x, self.__state_y, self.__state_h, self.__state_reading, self.__reading_x, self.__reading_y,
+                  self.__free_states):
+            a.flags.writeable = False
+
     def state_to_pose(self, s: int) -> (int, int, int):
         x = s // (self.__cols * self.__head)
         y = (s - x * self.__cols * self.__head) // self.__head
@@ -65,6 +89,45 @@ class StateModel:
     def reading_to_ref_state(self, r: int) -> int:
         return r * self.__head
 
+    # lookup arrays x, y and h of all states (read-only, indexed by state)
+    def get_state_poses(self) -> (np.array(1), np.array(1), np.array(1)):
+        return self.__state_x, self.__state_y, self.__state_h
+
+    # lookup array of the reading (position index) of all states (read-only, indexed by state)
+    def get_state_readings(self) -> np.array(1):
+        return self.__state_reading
+
+    def get_obstacle_map(self) -> ObstacleMap:
+        return self.__obstacles
+
+    # True for the states in cells the robot can be in (read-only, indexed by state)
+    def get_free_states(self) -> np.array(1):
+        return self.__free_states
+
+    # uniform distribution over the free states, the prior of all filters
+    def get_uniform_belief(self) -> np.array(1):
+        return self.__free_states / np.count_nonzero(self.__free_states)
+
+    # batch versions of the conversions above, they take and return arrays
+    def states_to_poses(self, s: np.array(1)) -> (np.array(1), np.array(1), np.array(1)):
+        return self.__state_x[s], self.__state_y[s], self.__state_h[s]
+
+    def states_to_positions(self, s: np.array(1)) -> (np.array(1), np.array(1)):
+        return self.__state_x[s], self.__state_y[s]
+
+    def states_to_readings(self, s: np.array(1)) -> np.array(1):
+        return self.__state_reading[s]
+
+    def poses_to_states(self, x: np.array(1), y: np.array(1), h: np.array(1)) -> np.array(1):
+        return (np.asarray(x) * self.__cols + y) * self.__head + h
+
+    # readings must be position indices, "nothing" cannot be converted
+    def readings_to_positions(self, r: np.array(1)) -> (np.array(1), np.array(1)):
+        return self.__reading_x[r], self.__reading_y[r]
+
+    def positions_to_readings(self, x: np.array(1), y: np.array(1)) -> np.array(1):
+        return np.asarray(x) * self.__cols + y
+
     def get_grid_dimensions(self) -> (int, int, int):
         return self.__rows, self.__cols, self.__head
 
@@ -1,86 +1,92 @@
 # The transition model contains the transition matrix and some methods for convenience,
 # including transposition
 #
-# The transition probabilities follow the rules given in the description:
+# The transition probabilities follow the rules given in the description, generalised by a MotionSpec
+# (see ModelSpecs) with keep_heading = 0.7 by default:
 #
-# P( h_t+1 = h_t | not encountering a wall) = 0.7
-# P( h_t+1 != h_t | not encountering a wall) = 0.3
+# P( h_t+1 = h_t | not encountering a wall) = keep_heading
+# P( h_t+1 != h_t | not encountering a wall) = 1 - keep_heading, split evenly over the free directions
 # P( h_t+1 = h_t | encountering a wall) = 0.0
-# P( h_t+1 != h_t | encountering a wall) = 1.0
+# P( h_t+1 != h_t | encountering a wall) = 1.0, split evenly over the free directions
 #
 # where it should always be assumed that the 'robot' first finds out how to turn (or not)
 # and then makes an actual step in that new direction, this is then considered a move (or step).
+# Walls are the borders of the grid, the blocked cells and the interior walls of the obstacle map of
+# the state model. Every free cell needs at least one free neighbour, otherwise the model is rejected
+# (the robot would have nowhere to go from there).
 #
 
 import numpy as np
-import matplotlib.pyplot as plt
-import random
 
-import models.StateModel
+from models.ModelSpecs import MotionSpec, STEP_X, STEP_Y
+
+# Only the (at most four) neighbouring cells can be reached in one step, and the new heading is
+# always the direction of that step. The model is therefore stored as successor tables with one
+# column per new heading, succ[i, nh] and succ_probs[i, nh] (missing neighbours point to state 0 with
+# probability 0), and the matching predecessor tables, pred[j, h] and pred_probs[j, h] with one column
+# per heading h of the predecessor. The dense matrix is only built when it is asked for.
 
 class TransitionModel:
-    def __init__(self, stateModel):
+    def __init__(self, stateModel, spec=None):
         self.__sm = stateModel
         self.__rows, self.__cols, self.__head = self.__sm.get_grid_dimensions()
+        self.__spec = spec if spec is not None else MotionSpec()
 
         self.__dim = self.__rows * self.__cols * self.__head
-
-        self.__matrix = np.zeros(shape=(self.__dim, self.__dim), dtype=float)
-        for i in range(self.__dim):
-            x, y, h = self.__sm.state_to_pose(i)
-            for j in range(self.__dim):
-                nx, ny, nh = self.__sm.state_to_pose(j)
-
-                # If the new position is one step away in a "legal" direction
-                if abs(x - nx) + abs(y - ny) == 1 and \
-                        (nh == 2 and nx == x - 1 or nh == 1 and ny == y + 1 or \
-                         nh == 0 and nx == x + 1 or nh == 3 and ny == y - 1):
-                    
-                    # entry where new and old heading are the same
-                    if nh == h:
-                        self.__matrix[i, j] = 0.7
-
-                    else: # entry where new and old heading are different, i.e., distributing probabilities for the "rest"
-                        if x != 0 and x != self.__rows - 1 and y != 0 and y != self.__cols - 1:
-                            self.__matrix[i, j] = 0.1
-
-                        # Facing a wall, not in a corner    
-                        elif h == 2 and x == 0 and y != 0 and y != self.__cols - 1 or \
-                                h == 1 and x != 0 and x != self.__rows - 1 and y == self.__cols - 1 or \
-                                h == 0 and x == self.__rows - 1 and y != 0 and y != self.__cols - 1 or \
-                                h == 3 and x != 0 and x != self.__rows - 1 and y == 0:
-
-                            self.__matrix[i, j] = 1.0 / 3.0
-                            
-                        # Going along a wall 
-                        elif h != 2 and x == 0 and y != 0 and y != self.__cols - 1 or \
-                                h != 1 and x != 0 and x != self.__rows - 1 and y == self.__cols - 1 or \
-                                h != 0 and x == self.__rows - 1 and y != 0 and y != self.__cols - 1 or \
-                                h != 3 and x != 0 and x != self.__rows - 1 and y == 0:
-
-                            self.__matrix[i, j] = 0.15
-
-                        # In a corner, facing wall    
-                        elif (h == 2 or h == 3) and (nh == 1 or nh == 0) and x == 0 and y == 0 or \
-                                (h == 2 or h == 1) and (nh == 0 or nh == 3) and x == 0 and y == self.__cols - 1 or \
-                                (h == 1 or h == 0) and (nh == 2 or nh == 3) and x == self.__rows - 1 and y == self.__cols - 1 or \
-                                (h == 0 or h == 3) and (nh == 2 or nh == 1) and x == self.__rows - 1 and y == 0:
-
-                            self.__matrix[i, j] = 0.5
-
-                        # In a corner, not facing wall    
-                        elif (h == 0 and nh == 1 or h == 1 and nh == 0) and x == 0 and y == 0 or \
-                                (h == 0 and nh == 3 or h == 3 and nh == 0) and x == 0 and y == self.__cols - 1 or \
-                                (h == 2 and nh == 1 or h == 1 and nh == 2) and x == self.__rows - 1 and y == 0 or \
-                                (h == 2 and nh == 3 or h == 3 and nh == 2) and x == self.__rows - 1 and y == self.__cols - 1:
-
-                            self.__matrix[i, j] = 0.3
-                            
-        # if we only have one row or colum in the grid, but more than 1 cells
-        if (self.__rows == 1 or self.__cols == 1) and self.__rows * self.__cols != 1:  
-            for i in range(self.__dim):
-                sum = np.sum(self.__matrix[i, :])
-                self.__matrix[i, :] = self.__matrix[i, :] / sum
+        self.__matrix = None
+
+        # successor in direction nh of every state, if the robot can step there
+        x, y, h = self.__sm.get_state_poses()
+        moves = self.__sm.get_obstacle_map().get_free_moves()
+        free = moves[x, y]
+        stuck = self.__sm.get_free_states() & ~free.any(axis=1)
+        if stuck.any():
+            cells = sorted(set(zip(x[stuck].tolist(), y[stuck].tolist())))
+            raise ValueError("free cells {} have no free neighbour, the robot could not move from there".format(cells))
+        nx = x[:, None] + np.array(STEP_X)[None, :]
+        ny = y[:, None] + np.array(STEP_Y)[None, :]
+        nh = np.broadcast_to(np.arange(self.__head), nx.shape)
+        self.__succ = np.where(free, self.__sm.poses_to_states(nx, ny, nh), 0)
+
+        # keep the heading if the way ahead is free, otherwise turn to one of the free directions
+        keep = self.__spec.keep_heading
+        num_free = np.count_nonzero(free, axis=1)[:, None]
+        ahead = free[np.arange(self.__dim), h][:, None]
+        turn = np.where(ahead, (1.0 - keep) / np.maximum(num_free - 1, 1), 1.0 / np.maximum(num_free, 1))
+        probs = np.where(nh == h[:, None], keep, turn)
+        probs[(ahead & (num_free == 1))[:, 0]] = 1.0 # nowhere to turn to, straight on
+        self.__succ_probs = np.where(free, probs, 0.0)
+
+        # predecessor of j with heading h: each state j = succ[i, nh] has exactly one i per heading h of i
+        self.__pred = np.zeros(shape=(self.__dim, self.__head), dtype=int)
+        self.__pred_probs = np.zeros(shape=(self.__dim, self.__head), dtype=float)
+        i, k = np.nonzero(self.__succ_probs > 0.0)
+        self.__pred[self.__succ[i, k], h[i]] = i
+        self.__pred_probs[self.__succ[i, k], h[i]] = self.__succ_probs[i, k]
+
+    # build the dense matrix from the successor tables (only done on demand)
+    def __dense(self) -> np.array(2):
+        if self.__matrix is None:
+            self.__matrix = np.zeros(shape=(self.__dim, self.__dim), dtype=float)
+            rows = np.repeat(np.arange(self.__dim), self.__head)
+            np.add.at(self.__matrix, (rows, self.__succ.ravel()), self.__succ_probs.ravel())
+        return self.__matrix
+
+    # successor states and their probabilities (dimensions: nr_of_states x 4, column = new heading)
+    def get_successors(self) -> (np.array(2), np.array(2)):
+        return self.__succ, self.__succ_probs
+
+    # predecessor states and their probabilities (dimensions: nr_of_states x 4, column = old heading)
+    def get_predecessors(self) -> (np.array(2), np.array(2)):
+        return self.__pred, self.__pred_probs
+
+    # one prediction step T^T @ f using the sparse structure
+    def propagate(self, f: np.array(1)) -> np.array(1):
+        return np.sum(self.__pred_probs * f[self.__pred], axis=1)
+
+    # one backward step T @ b using the sparse structure
+    def back_propagate(self, b: np.array(1)) -> np.array(1):
+        return np.sum(self.__succ_probs * b[self.__succ], axis=1)
 
     # retrieve the number of states represented in the matrix
     def get_num_of_states(self) -> int:
@@ -88,20 +94,21 @@ class TransitionModel:
 
     # get the probability to go from state i to j
     def get_T_ij(self, i: int, j: int) -> float:
-        return self.__matrix[i, j]
+        return self.__dense()[i, j]
 
     # get the entire matrix (dimensions: nr_of_states x nr_of_states, type float)
     def get_T(self) -> np.array(2):
-        return self.__matrix.copy()
+        return self.__dense().copy()
 
     # get the transposed transition matrix (dimensions: nr_of_states x nr_of_states, type float)
     def get_T_transp(self) -> np.array(2):
-        transp = np.transpose(self.__matrix)
+        transp = np.transpose(self.__dense())
         return transp
 
     # plot matrix as a heat map
     def plot_T(self):
-        plt.matshow(self.__matrix)
+        import matplotlib.pyplot as plt  # only needed for plotting, the model itself works without it
+        plt.matshow(self.__dense())
         plt.colorbar()
         plt.show()
 
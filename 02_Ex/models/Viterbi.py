@@ -0,0 +1,64 @@
+#
+# Viterbi decoder: the most likely sequence of states for a whole log of sensor readings.
+#
+# Every state j has at most four predecessors, one per heading h of the predecessor (see the
+# predecessor tables of the TransitionModel), so one step costs O(S * 4) instead of O(S^2).
+# For the same reason a backpointer only has to say which heading the predecessor had, and is
+# stored as one uint8 per state and step instead of a full state index.
+#
+# The computation is done with log-probabilities; the scores are shifted by their maximum in every
+# step, so long logs neither underflow nor lose precision.
+#
+
+import numpy as np
+
+
+class ViterbiDecoder:
+    def __init__(self, sm, tm, om):
+        self.__sm = sm # state model
+        self.__tm = tm # transition model
+        self.__om = om # observation model
+
+        self.__pred, pred_probs = self.__tm.get_predecessors()
+        with np.errstate(divide="ignore"):
+            self.__log_pred_probs = np.log(pred_probs)
+        self.__rows = np.arange(self.__sm.get_num_of_states())
+
+    def __log_o(self, reading) -> np.array(1):
+        with np.errstate(divide="ignore"):
+            return np.log(self.__om.get_o_reading_state_probs(reading))
+
+    # most likely states for the readings of steps 1 ... T (None for "nothing"), readings can be
+    # any iterable. Returns the states and positions as arrays of shape (T,) and (T, 2), and the
+    # number of breaks, i.e. readings that no path could explain and where decoding started over.
+    def decode(self, readings) -> (np.array(1), np.array(2), int):
+        num_states = self.__sm.get_num_of_states()
+        delta = np.where(self.__sm.get_free_states(), 0.0, -np.inf) # log of the uniform prior, up to a constant
+        backpointers = []
+        restarts = {} # step -> best state of the step before, where the path had to start over
+
+        for reading in readings:
+            scores = delta[self.__pred] + self.__log_pred_probs
+            bp = np.argmax(scores, axis=1).astype(np.uint8)
+            new_delta = scores[self.__rows, bp] + self.__log_o(reading)
+
+            best = np.max(new_delta)
+            if best == -np.inf:
+                # no path explains this reading, start over from the reading alone
+                restarts[len(backpointers)] = np.argmax(delta)
+                new_delta = self.__log_o(reading)
+                best = np.max(new_delta)
+            delta = new_delta - best
+            backpointers.append(bp)
+
+        states = np.empty(len(backpointers), dtype=int)
+        if len(backpointers) > 0:
+            states[-1] = np.argmax(delta)
+            for t in range(len(backpointers) - 1, 0, -1):
+                if t in restarts:
+                    states[t - 1] = restarts[t]
+                else:
+                    states[t - 1] = self.__pred[states[t], backpointers[t][states[t]]]
+
+        positions = np.stack(self.__sm.states_to_positions(states), axis=1)
+        return states, positions, len(restarts)
@@ -1,6 +1,11 @@
-__all__ = ["StateModel", "TransitionModel","ObservationModel","Localizer"]
+__all__ = ["StateModel", "TransitionModel","ObservationModel","Localizer","FixedLagSmoother","ForwardBackwardSmoother","ViterbiDecoder","SensorSpec","MotionSpec","ObstacleMap","LocalizationMetrics","MultiResolutionLocalizer"]
 
+from models.ModelSpecs import SensorSpec, MotionSpec, ObstacleMap
 from models.StateModel import StateModel
 from models.TransitionModel import TransitionModel
 from models.ObservationModel import ObservationModel
-from models.Localizer import Localizer
\ No newline at end of file
+from models.Metrics import LocalizationMetrics
+from models.Localizer import Localizer
+from models.MultiResolution import MultiResolutionLocalizer
+from models.Smoother import FixedLagSmoother, ForwardBackwardSmoother
+from models.Viterbi import ViterbiDecoder
@@ -1,10 +1,8 @@
 import numpy as np
 import matplotlib.pyplot as plt
 import time
-import importlib
 
-#heatmap and custom colors
-import seaborn as sns 
+#custom colors
 from matplotlib import cm
 from matplotlib.colors import ListedColormap
 
@@ -18,8 +16,9 @@ from IPython.display import display,clear_output
 import threading
 
 from models import *
+from viewer.HeatmapRenderer import HeatmapRenderer
+from viewer.SnapshotBuffer import SnapshotBuffer
 
-#importlib.reload(Localizer)
 
 def create_colour_map():
     top = cm.get_cmap('autumn', 128)
@@ -42,55 +41,71 @@ def create_colour_map():
 newcmp = create_colour_map()
 
 
-def create_map_with_heading(plt, room, numbers):
-    global newcmp
-
-    ax = sns.heatmap(room, vmin=0, vmax=2, annot=numbers, fmt=".3f", \
-                     xticklabels=False, yticklabels=False, cbar=False, cmap=newcmp)
-
-    pos_hlines = np.arange(0, room.shape[0]+1, 3)
-    pos_vlines = np.arange(0, room.shape[1]+1, 3)
-        
-    ax.hlines(pos_hlines, *ax.get_xlim())
-    ax.vlines(pos_vlines, *ax.get_ylim())
-
-
-    for t in ax.texts:
-        if t.get_text() == "2.000" or t.get_text() == "1.008" or t.get_text() == "0.992" or t.get_text() == "nan":
-            t.set_text("")
-    return plt
-
-
 def create_map(plt, room):
     plt.pcolor(room, cmap='Spectral', edgecolors='k', linewidths=3)
     return plt
 
 
 
+# The simulation is split into a producer and a consumer thread: the simulation worker advances the
+# filter as fast as requested and pushes every step as a snapshot into a bounded ring buffer, the
+# render thread draws the newest snapshot at most fps times per second. The worker only holds
+# "mutex" (model and counters), the renderer only "render_mutex", so the filter never waits on plotting.
+
 stop_thread = True
-thread = None
+thread = None         # simulation worker (producer)
+render_thread = None  # renderer (consumer)
 mutex = threading.Lock()
+render_mutex = threading.Lock()
 
 
 def simulation(dash):
     global stop_thread
     print('new simulation started')
 
-    sleep_time = dash.plot_time
     while not stop_thread:
+        dash.buffer.push(dash.simulate_one_step())
+        if dash.steps_per_second:
+            time.sleep(1.0 / dash.steps_per_second)
 
-        try:
-            dash.update_grid_one_step(False)
-            time.sleep(sleep_time)
-        finally:
-            pass
 
+def rendering(dash):
+    global stop_thread
+
+    while not stop_thread:
+        start = time.perf_counter()
+        snapshot = dash.buffer.take_latest(timeout=0.1) # blocks instead of spinning while nothing is new
+        if snapshot is not None:
+            dash.render_snapshot(snapshot, True)
+        dash.update_metrics()
+        if dash.fps: # None or 0: no frame cap
+            time.sleep(max(0.0, 1.0 / dash.fps - (time.perf_counter() - start)))
+
+
+# stops both threads, must not be called while holding mutex or render_mutex
+def stop_simulation():
+    global thread
+    global render_thread
+    global stop_thread
+
+    stop_thread = True
+    if thread != None:
+        thread.join()
+        thread = None
+    if render_thread != None:
+        render_thread.join()
+        render_thread = None
 
 
 class Dashboard:
 
-    def __init__(self, ROOM_HEIGHT, ROOM_WIDTH):
-        
+    def __init__(self, ROOM_HEIGHT, ROOM_WIDTH, fps=10.0, steps_per_second=None):
+        for name, rate in (("fps", fps), ("steps_per_second", steps_per_second)):
+            if rate is not None and not (isinstance(rate, (int, float)) and rate >= 0):
+                raise ValueError("{} must be None or a non-negative number, got {!r}".format(name, rate))
+
+        self.fps = fps  # maximum number of frames per second drawn while the simulation runs, None or 0 = no cap
+        self.steps_per_second = steps_per_second  # simulation rate limit, None or 0 = as fast as possible
         
         self.slider_h = widgets.IntSlider(min=ROOM_HEIGHT, max=10, step=1, description='Height', value=ROOM_HEIGHT)
         self.slider_w = widgets.IntSlider(min=ROOM_WIDTH, max=10, step=1, description='Width', value=ROOM_WIDTH)
@@ -124,7 +139,8 @@ class Dashboard:
         self.rhs = self.out
         self.middle = widgets.HBox([self.lhs, self.rhs])
         self.animation = widgets.HBox([self.btn_if, self.btn_os, self.btn_go, self.btn_sp])
-        self.db = widgets.VBox([self.input_widgets, self.middle, self.animation])
+        self.metrics = widgets.Label()
+        self.db = widgets.VBox([self.input_widgets, self.middle, self.animation, self.metrics])
 
         # setup of the initial simulation
         self.room = StateModel(self.slider_h.value, self.slider_w.value)
@@ -132,56 +148,40 @@ class Dashboard:
 
         self.rows, self.cols, self.head = self.room.get_grid_dimensions()
         self.num_states = self.room.get_num_of_states()
-        self.total_error = 0
-        self.correct_guesses = 0
-        self.nbr_of_moves = 0
         self.initialised = False
 
-        self.plot_time = 0.01 * self.rows * self.cols * self.head
-
         # transition matrix and observation matrix visualization
         self.transition_step = 0
         self.observation_step = self.rows * self.cols
 
-        self.visualizationroom = np.empty(shape=(self.rows * 3, self.cols * 3))
-
-        if self.head == 4:
-            self.visrow_iter = [2, 1, 0, 1]
-            self.viscol_iter = [1, 2, 1, 0]
-        else:
-            self.visrow_iter = [0]
-            self.viscol_iter = [0]
+        self.renderer = HeatmapRenderer(self.room, self.out, newcmp, self.fps)
+        self.buffer = SnapshotBuffer()
+        self.frames_drawn = 0
+        self.last_metrics = (time.perf_counter(), 0, 0)  # time, moves and frames at the last metrics update
 
     def on_slider_change(self, obj):
-        global thread
-        global stop_thread
         global mutex
+        global render_mutex
+
+        # if you change the dimensions of the room we have to stop the ongoing simulation thread
+        stop_simulation()
 
         mutex.acquire()
         try:
-            # if you change the dimensions of the room we have to stop the ongoing simulation thread
-            if thread != None:
-                stop_thread = True
-                time.sleep(0.1)
-                thread.join()
-                thread = None
-            # setup a new room and model
+            # setup a new room and model (with new counters for steps, accuracy, etc.)
             self.room = StateModel(self.slider_h.value, self.slider_w.value)
             self.model = Localizer(self.room)
-            # reset the counters for steps, accuracy, etc.
 
             self.rows, self.cols, self.head = self.room.get_grid_dimensions()
             self.num_states = self.room.get_num_of_states()
             self.num_readings = self.room.get_num_of_readings()
 
-            self.total_error = 0
-            self.correct_guesses = 0
-            self.nbr_of_moves = 0
             self.initialised = False
 
-            self.plot_time = 0.01 * self.rows * self.cols * self.head
-
-            self.visualizationroom = np.empty(shape=(self.rows * 3, self.cols * 3))
+            with render_mutex:
+                self.renderer.close()
+                self.renderer = HeatmapRenderer(self.room, self.out, newcmp, self.fps)
+            self.buffer.clear()
 
             # transition matrix and observation matrix visualization
             self.transition_step = 0
@@ -196,29 +196,13 @@ class Dashboard:
         mutex.acquire()
         try:
             # print('Hello from the {} button!'.format(obj.description))
-            self.visualizationroom[:] = np.NaN
-
             # CHECK HERE!!!
             T_hat = self.model.get_transition_model().get_T()[self.transition_step][:]
 
-            for state in range(self.num_states):
-                r, c, h = self.room.state_to_pose(state)
-                visrow = r * 3 + self.visrow_iter[h]
-                viscol = c * 3 + self.viscol_iter[h]
-
-                self.visualizationroom[visrow, viscol] = T_hat[state]
-
-                if self.transition_step == state:
-                    self.visualizationroom[visrow, viscol] = 129 / 256 * 2
-
-            plt.close('all')
-            plt.figure(1, figsize=(10, 10))
-            plot = create_map_with_heading(plt, self.visualizationroom, True)
-
-            if plot == None:
-                pass
-            else:
-                self.update_plt(plot, True)
+            with render_mutex:
+                self.renderer.set_states(T_hat)
+                self.renderer.mark_state(self.transition_step, 129 / 256 * 2)
+                self.renderer.draw(True)
 
             self.transition_step += 1
             if self.transition_step >= T_hat.size:
@@ -231,27 +215,12 @@ class Dashboard:
         mutex.acquire()
         try:
             # print('Hello from the {} button!'.format(obj.description))
-            self.visualizationroom[:] = np.NaN
-
-            for state in range(self.num_states):
-                r, c, h = self.room.state_to_pose(state)
-                visrow = r * 3 + self.visrow_iter[h]
-                viscol = c * 3 + self.viscol_iter[h]
-
-                self.visualizationroom[visrow, viscol] = self.model.get_observation_model().get_o_reading_state(
-                    self.observation_step, state)
-
-                if self.observation_step == self.room.state_to_reading(state) \
-                        and h == 2 and self.observation_step != self.rows * self.cols:
-                    self.visualizationroom[visrow+1, viscol] = 129 / 256 * 2
-
-            plt.close('all')
-            plt.figure(1, figsize=(10, 10))
-            plot = create_map_with_heading(plt, self.visualizationroom, True)
-            if plot == None:
-                pass
-            else:
-                self.update_plt(plot, True)
+            with render_mutex:
+                self.renderer.set_states(self.model.get_observation_model().get_o_reading_state_probs(self.observation_step))
+                if self.observation_step != self.rows * self.cols:
+                    r, c = self.room.reading_to_position(self.observation_step)
+                    self.renderer.mark_position(r, c, 129 / 256 * 2)
+                self.renderer.draw(True)
 
             self.observation_step += 1
             if self.observation_step > self.rows * self.cols:
@@ -261,70 +230,47 @@ class Dashboard:
 
     def btn_if_eventhandler(self, obj):
         global mutex
-        global thread
         global stop_thread
 
+        stop_simulation()
+
         mutex.acquire()
         try:
             # print('Hello from the {} button!'.format(obj.description))
 
-            # reset the counters for steps, accuracy, etc.
-            self.total_error = 0
-            self.correct_guesses = 0
-            self.nbr_of_moves = 0
-
             # then we can allow to start a new simulation thread
             stop_thread = False
             self.initialised = True
 
-            self.model.initialise()
+            self.model.initialise()  # also resets the counters for steps, accuracy, etc.
 
             true_x, true_y, h = self.model.get_current_true_pose()
 
-            self.visualizationroom[:] = np.NaN
-            
-            for state in range(self.num_states):
-                r, c, h = self.room.state_to_pose(state)
-                visrow = r * 3 + self.visrow_iter[h]
-                viscol = c * 3 + self.viscol_iter[h]
-                self.visualizationroom[visrow, viscol] = self.model.get_current_f_vector()[state]
-
-            self.visualizationroom[true_x * 3 + 1, true_y * 3 + 1] = 256 / 256 * 2
-
-            plt.close('all')
-            plt.figure(1, figsize=(10, 10))
-            plot = create_map_with_heading(plt, self.visualizationroom, True)
-
-            if plot == None:
-                print("plot is none")
-            else:
-                self.update_plt(plot, True)
+            with render_mutex:
+                self.renderer.set_states(self.model.get_current_f_vector())
+                self.renderer.mark_position(true_x, true_y, 256 / 256 * 2)
+                self.renderer.draw(True)
+            self.buffer.clear()
+            self.update_metrics(True)
         finally:
             mutex.release()
 
     def btn_os_eventhandler(self, obj):
-        global mutex
-        global thread
-        try:
-            global stop_thread
-            if thread != None:
-                # if you change the dimensions of the room we have to stop the ongoing simulation thread
-                stop_thread = True
-                time.sleep(0.1)
-                thread.join()
-                thread = None
-
-            if self.initialised:
-                self.update_grid_one_step(True)
-                stop_thread = False
-            else:
-                print("initialise filter first!")
-        finally:
-            pass
+        global stop_thread
+
+        # a single step stops an ongoing simulation first
+        stop_simulation()
+
+        if self.initialised:
+            self.update_grid_one_step(True)
+            stop_thread = False
+        else:
+            print("initialise filter first!")
 
     def btn_go_eventhandler(self, obj):
         global mutex
         global thread
+        global render_thread
         global stop_thread
 
         mutex.acquire()
@@ -336,88 +282,58 @@ class Dashboard:
                 if not stop_thread and thread == None:
                     # if it isn't, then start it.
                     thread = threading.Thread(target=simulation, args=(self,))
+                    render_thread = threading.Thread(target=rendering, args=(self,))
                     thread.start()
+                    render_thread.start()
 
         finally:
             mutex.release()
 
     def btn_sp_eventhandler(self, obj):
-        global mutex
-        global thread
         global stop_thread
 
-        mutex.acquire()
-        try:
-
-            if thread != None:
-                stop_thread = True
-                time.sleep(0.1)
-                thread.join()
-                thread = None
-
-            print("thread stopped")
-
-            if self.initialised:
-                stop_thread = False
+        stop_simulation()
+        print("thread stopped")
 
-        finally:
-            mutex.release()
+        if self.initialised:
+            stop_thread = False
 
-    def update_grid_one_step(self, plotting):
+    # advances the filter by one step (the model keeps the error metrics), returns the snapshot for rendering
+    def simulate_one_step(self):
         global mutex
-        mutex.acquire()
-
-        try:
-            sensed, trueR, trueC, trueH, sensedR, sensedC, guessedR, guessedC, error, f = self.model.update()
 
-            
-            self.visualizationroom[:] = np.NaN
-            for state in range(self.num_states):
-                r, c, h = self.room.state_to_pose(state)
-                visrow = r * 3 + self.visrow_iter[h]
-                viscol = c * 3 + self.viscol_iter[h]
-                self.visualizationroom[visrow, viscol] = f[state]
+        with mutex:
+            return self.model.update()
 
-            if sensed:
-                self.visualizationroom[sensedR * 3 + 1, sensedC * 3 + 1] = 129 / 256 * 2 #turquoise
-            self.visualizationroom[guessedR * 3 + 1, guessedC * 3 + 1] = 127 / 256 * 2 #red
-            self.visualizationroom[trueR * 3 + 1, trueC * 3 + 1] = 256 / 256 * 2 #black
-
-            plt.close('all')
-            plt.figure(1, figsize=(10, 10))
-            plot = create_map_with_heading(plt, self.visualizationroom, True)
-
-            if plot == None:
-                pass
-            else:
-                self.update_plt(plot, plotting)
+    def render_snapshot(self, snapshot, plotting):
+        global render_mutex
+        sensed, trueR, trueC, trueH, sensedR, sensedC, guessedR, guessedC, error, f = snapshot
 
+        with render_mutex:
+            self.renderer.set_states(f)
             if sensed:
-                print('true pose = <{}, {}, {}>, sensed position = <{}, {}>, guessed position = <{}, {}>'.format(trueR, trueC, trueH, sensedR, sensedC, guessedR, guessedC))
-            else:
-                print('true pose = <{}, {}, {}>, sensed nothing'.format(trueR, trueC, trueH))
-                
-                
-            # update the total error and correct guesses with something useful for the visualisation
-
-            self.total_error += error
-            if error == 0 :
-                self.correct_guesses += 1
-            self.nbr_of_moves +=1 
-            print('nbr of moves: {}, avg error: {}, nbr correct guesses: {}'.format(self.nbr_of_moves, self.total_error/self.nbr_of_moves, self.correct_guesses))
-
-
-
-        finally:
-            mutex.release()
-            pass
-
-    def update_plt(self, plt, plotting):
-        with self.out:
-            clear_output(wait=True)
-            plt.figure(1, figsize=(10, 10))
-            if plotting:
-                display(plt.show())
-
-
+                self.renderer.mark_position(sensedR, sensedC, 129 / 256 * 2) #turquoise
+            self.renderer.mark_position(guessedR, guessedC, 127 / 256 * 2) #red
+            self.renderer.mark_position(trueR, trueC, 256 / 256 * 2) #black
+            if self.renderer.draw(plotting):
+                self.frames_drawn += 1
+
+    # steps per second, frames per second and dropped frames since the last update and the error metrics
+    # of the run (at most twice a second)
+    def update_metrics(self, force=False):
+        now = time.perf_counter()
+        last_time, last_moves, last_frames = self.last_metrics
+        if not force and now - last_time < 0.5:
+            return
+        dt = max(now - last_time, 1e-9)
+        errors = self.model.get_metrics().summary()
+        self.last_metrics = (now, errors["steps"], self.frames_drawn)
+
+        self.metrics.value = 'steps/s: {:.0f}, render fps: {:.1f}, dropped frames: {}, nbr of moves: {}, avg error: {:.3f}, hit rate: {:.3f}, median / 90% error: {} / {}'.format(
+            (errors["steps"] - last_moves) / dt, (self.frames_drawn - last_frames) / dt, self.buffer.get_num_dropped(),
+            errors["steps"], errors["avg_error"] if errors["steps"] else 0.0, errors["hit_rate"] if errors["steps"] else 0.0,
+            errors["median_error"], errors["p90_error"])
 
+    def update_grid_one_step(self, plotting):
+        self.render_snapshot(self.simulate_one_step(), plotting)
+        self.update_metrics(True)
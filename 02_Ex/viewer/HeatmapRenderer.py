@@ -0,0 +1,102 @@
+import time
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+import ipywidgets as widgets
+from IPython.display import display, clear_output
+
+#
+# Renders the room as a heat map with one 3x3 block of cells per grid position: the four outer
+# cells of a block hold the values of the four headings, the center cell is used for markers
+# (true position, sensor reading, estimate).
+#
+# The figure, the image and the annotation texts are created once; a new frame only replaces the
+# image data and the texts that changed. Frames are throttled to at most fps per second, unless
+# they are forced (e.g. for single steps and button clicks).
+#
+
+class HeatmapRenderer:
+
+    def __init__(self, room, out, cmap, fps=10.0):
+        self.__out = out
+        self.__min_frame_time = 1.0 / fps if fps else 0.0
+        self.__last_frame = 0.0
+        self.__shown = False
+
+        rows, cols, head = room.get_grid_dimensions()
+        num_states = room.get_num_of_states()
+
+        # index map state -> cell of the heat map, computed once
+        if head == 4:
+            visrow_iter = [2, 1, 0, 1]
+            viscol_iter = [1, 2, 1, 0]
+        else:
+            visrow_iter = [0]
+            viscol_iter = [0]
+        r, c, h = room.get_state_poses()
+        self.__visrows = r * 3 + np.array(visrow_iter)[h]
+        self.__viscols = c * 3 + np.array(viscol_iter)[h]
+
+        self.__values = np.full(shape=(rows * 3, cols * 3), fill_value=np.nan)
+        self.__marked = np.zeros(num_states, dtype=bool)
+        self.__labels = [""] * num_states
+
+        with plt.ioff():
+            self.__fig = plt.figure(figsize=(10, 10))
+        ax = self.__fig.add_axes([0, 0, 1, 1])
+        self.__image = ax.imshow(self.__values, cmap=cmap, vmin=0, vmax=2, aspect="auto", interpolation="nearest")
+        ax.set_xticks([])
+        ax.set_yticks([])
+        ax.hlines(np.arange(0, rows * 3 + 1, 3) - 0.5, -0.5, cols * 3 - 0.5, colors="k")
+        ax.vlines(np.arange(0, cols * 3 + 1, 3) - 0.5, -0.5, rows * 3 - 0.5, colors="k")
+        self.__texts = [ax.text(self.__viscols[state], self.__visrows[state], "", ha="center", va="center", fontsize=8)
+                        for state in range(num_states)]
+
+    # show a value per state (e.g. the f vector), clears all markers
+    def set_states(self, values):
+        self.__values[:] = np.nan
+        self.__values[self.__visrows, self.__viscols] = values
+        self.__marked[:] = False
+
+    # marker colour at the center of the block of position (r, c)
+    def mark_position(self, r, c, value):
+        self.__values[r * 3 + 1, c * 3 + 1] = value
+
+    # marker colour in the cell of a single state, its value is not annotated
+    def mark_state(self, state, value):
+        self.__values[self.__visrows[state], self.__viscols[state]] = value
+        self.__marked[state] = True
+
+    # draws a frame, unless the last one was less than 1 / fps ago and force is False.
+    # returns True if the frame was drawn
+    def draw(self, force=False) -> bool:
+        now = time.perf_counter()
+        if not force and now - self.__last_frame < self.__min_frame_time:
+            return False
+        self.__last_frame = now
+
+        self.__image.set_data(self.__values)
+        for state, value in enumerate(self.__values[self.__visrows, self.__viscols]):
+            label = "" if self.__marked[state] or np.isnan(value) else "{:.3f}".format(value)
+            if label != self.__labels[state]:
+                self.__texts[state].set_text(label)
+                self.__labels[state] = label
+
+        if isinstance(self.__fig.canvas, widgets.DOMWidget):
+            # interactive backend (%matplotlib widget): the canvas is shown once and redrawn in place
+            if not self.__shown:
+                with self.__out:
+                    clear_output(wait=True)
+                    display(self.__fig.canvas)
+                self.__shown = True
+            self.__fig.canvas.draw_idle()
+        else:
+            # inline backend: the rendered image replaces the previous one
+            with self.__out:
+                clear_output(wait=True)
+                display(self.__fig)
+        return True
+
+    def close(self):
+        plt.close(self.__fig)
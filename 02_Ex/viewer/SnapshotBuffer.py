@@ -0,0 +1,53 @@
+import threading
+from collections import deque
+
+#
+# Bounded ring buffer between the simulation worker (producer) and the renderer (consumer).
+#
+# The producer never waits: when the buffer is full the oldest snapshot is overwritten. The consumer
+# only ever wants the newest snapshot, so taking it discards everything older. Both overwritten
+# and discarded snapshots count as dropped frames. The consumer can block until a snapshot arrives,
+# so an uncapped renderer does not spin while the producer has nothing new.
+#
+
+class SnapshotBuffer:
+
+    def __init__(self, capacity=8):
+        self.__buffer = deque(maxlen=capacity)
+        self.__lock = threading.Lock()
+        self.__new_snapshot = threading.Condition(self.__lock)
+        self.__pushed = 0
+        self.__dropped = 0
+
+    def push(self, snapshot):
+        with self.__lock:
+            if len(self.__buffer) == self.__buffer.maxlen:
+                self.__dropped += 1
+            self.__buffer.append(snapshot)
+            self.__pushed += 1
+            self.__new_snapshot.notify()
+
+    # the newest snapshot (None if nothing new was pushed since the last call), with a timeout waits
+    # up to timeout seconds for the next snapshot if there is none yet
+    def take_latest(self, timeout=None):
+        with self.__lock:
+            if not self.__buffer and timeout:
+                self.__new_snapshot.wait(timeout)
+            if not self.__buffer:
+                return None
+            snapshot = self.__buffer.pop()
+            self.__dropped += len(self.__buffer)
+            self.__buffer.clear()
+            return snapshot
+
+    def clear(self):
+        with self.__lock:
+            self.__buffer.clear()
+            self.__pushed = 0
+            self.__dropped = 0
+
+    def get_num_pushed(self) -> int:
+        return self.__pushed
+
+    def get_num_dropped(self) -> int:
+        return self.__dropped
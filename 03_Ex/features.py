@@ -0,0 +1,132 @@
+#
+# Streaming letter counts of text files, the features of the Salammbo classifiers: the total number
+# of letters and the number of A's of a text (see ai_lab_perceptron_students.ipynb).
+#
+# A file is read in chunks of CHUNK bytes into one preallocated buffer, every chunk is counted with
+# np.bincount over its uint8 view, so memory per worker does not depend on the file size. Texts are
+# assumed to be UTF-8: a letter is an ASCII letter or a two-byte character of the Latin-1 supplement
+# (lead byte 0xC3, which covers the accented letters of French), an A is one of a, A, à, â, ä, À, Â, Ä.
+# The two-byte characters are counted from the pairs (0xC3, next byte), also across chunk borders.
+#
+# Files are split into ranges of at most RANGE bytes, and the ranges of all files are counted in
+# parallel by a process pool, so a few very large files are spread over the workers as well.
+#
+# Example (from the 03_Ex directory), with one sub-directory per language:
+#
+#   python features.py corpus/en/*.txt corpus/fr/*.txt --labels-from-parent --out features.npz
+#
+
+import argparse
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+CHUNK = 1 << 24 # bytes per read
+RANGE = 1 << 28 # bytes per task
+LEAD = 0xC3 # UTF-8 lead byte of U+00C0 ... U+00FF
+ASCII_LETTERS = np.array([c for c in range(256) if chr(c).isascii() and chr(c).isalpha()])
+ASCII_A = np.array([ord("a"), ord("A")])
+# second bytes of the letters U+00C0 ... U+00FF (all but × and ÷), and of à, â, ä, À, Â, Ä
+LATIN1_LETTERS = np.array([b for b in range(0x80, 0xC0) if chr(0x40 + b).isalpha()])
+LATIN1_A = np.array([b for b in range(0x80, 0xC0) if chr(0x40 + b) in "àâäÀÂÄ"])
+
+
+# byte histogram and histogram of the bytes following a lead byte, of bytes start ... stop - 1
+def count_range(path, start, stop) -> (np.array(1), np.array(1)):
+    histogram = np.zeros(256, dtype=np.int64)
+    following = np.zeros(256, dtype=np.int64)
+    buffer = bytearray(CHUNK + 1)
+    view = memoryview(buffer)
+    with open(path, "rb") as f:
+        # the byte before the range, in case it is a lead byte
+        f.seek(max(start - 1, 0))
+        buffer[0] = f.read(1)[0] if start > 0 else 0
+        f.seek(start)
+
+        position = start
+        while position < stop:
+            n = f.readinto(view[1:1 + min(CHUNK, stop - position)])
+            if n == 0:
+                break
+            chunk = np.frombuffer(buffer, dtype=np.uint8, count=n + 1)
+            histogram += np.bincount(chunk[1:], minlength=256)
+            following += np.bincount(chunk[1:][chunk[:-1] == LEAD], minlength=256)
+            buffer[0] = buffer[n]
+            position += n
+    return histogram, following
+
+
+# (number of letters, number of A's) from the two histograms
+def letter_counts(histogram, following) -> (int, int):
+    letters = np.sum(histogram[ASCII_LETTERS]) + np.sum(following[LATIN1_LETTERS])
+    a = np.sum(histogram[ASCII_A]) + np.sum(following[LATIN1_A])
+    return int(letters), int(a)
+
+
+def file_ranges(path):
+    size = os.path.getsize(path)
+    return [(path, start, min(start + RANGE, size)) for start in range(0, max(size, 1), RANGE)]
+
+
+def _count_task(task):
+    return count_range(*task)
+
+
+# feature matrix (number of letters, number of A's) with one row per file, counted by `workers`
+# processes (None for all cores, 1 for none). With intercept=True a first column of ones is added,
+# as the trainers in linear.py expect.
+def extract_features(paths, workers=None, intercept=False) -> np.array(2):
+    tasks = [task for path in paths for task in file_ranges(path)]
+    owners = np.array([i for i, path in enumerate(paths) for _ in file_ranges(path)], dtype=int)
+
+    histograms = np.zeros((len(paths), 256), dtype=np.int64)
+    following = np.zeros((len(paths), 256), dtype=np.int64)
+    if workers == 1:
+        results = map(_count_task, tasks)
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers)
+        results = pool.map(_count_task, tasks, chunksize=max(1, len(tasks) // (4 * (workers or os.cpu_count() or 1))))
+    try:
+        for owner, (h, f) in zip(owners, results):
+            histograms[owner] += h
+            following[owner] += f
+    finally:
+        if workers != 1:
+            pool.shutdown()
+
+    X = np.array([letter_counts(h, f) for h, f in zip(histograms, following)], dtype=float).reshape(-1, 2)
+    if intercept:
+        X = np.hstack([np.ones((X.shape[0], 1)), X])
+    return X
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count letters and A's of text files")
+    parser.add_argument("paths", nargs="+", help="text files (UTF-8)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--intercept", action="store_true", help="add a first column of ones")
+    parser.add_argument("--labels-from-parent", action="store_true",
+                        help="classes from the names of the parent directories, in sorted order")
+    parser.add_argument("--out", default=None, help="save X (and y) as .npz, otherwise print the matrix")
+    args = parser.parse_args()
+
+    X = extract_features(args.paths, args.workers, args.intercept)
+    arrays = {"X": X, "paths": np.array(args.paths)}
+    if args.labels_from_parent:
+        parents = [os.path.basename(os.path.dirname(os.path.abspath(p))) for p in args.paths]
+        classes = sorted(set(parents))
+        arrays["y"] = np.array([classes.index(p) for p in parents])
+        arrays["classes"] = np.array(classes)
+        print("classes:", ", ".join("{} = {}".format(i, c) for i, c in enumerate(classes)), file=sys.stderr)
+
+    if args.out:
+        np.savez(args.out, **arrays)
+    else:
+        for path, row in zip(args.paths, X):
+            print(path, *row.astype(int))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+#
+# Linear regression, the perceptron and logistic regression by gradient descent, as in
+# ai_lab_perceptron_students.ipynb, for feature matrices with many rows.
+#
+# All three share one training loop: every epoch the rows are visited in (shuffled) mini-batches,
+# for every batch the error y - prediction gives the step w += alpha * X_b^T @ error (divided by
+# the batch size for linear and logistic regression, as in the notebook's batch versions). With
+# batch_size=None one batch is the whole matrix, which reproduces the notebook's fit_batch, with
+# batch_size=1 it is the stochastic version.
+#
+# - shuffling draws one permutation per epoch, a batch is a slice (view) of it, and its rows are
+#   gathered into buffers that are allocated once, so X is never copied as a whole
+# - the stop criterion of the notebook: the norm of the gradient (linear and logistic regression) or
+#   the number of misclassified examples in an epoch (perceptron)
+# - early stopping: with validation data, training stops when the validation loss has not improved
+#   for `patience` epochs, and the best weights are kept
+# - streaming: partial_fit runs one pass over a chunk, fit_stream trains in a single pass over an
+#   iterable of chunks, updating online scalers (scalers.py) on the way
+#
+# Weights are 1-d arrays with the intercept (if X has a column of ones) as an ordinary weight, y can
+# be a vector or a column vector. Example, with X_ and y_ as in the notebook:
+#
+#   model = Perceptron().fit(X_, y_)
+#   model.w, model.epoch, model.predict(X_)
+#
+
+import numpy as np
+
+
+def logistic(x):
+    # 1 / (1 + exp(-x)) without overflow for large negative x
+    return np.exp(-np.logaddexp(0.0, -x))
+
+
+# divides every column by its maximum, returns the normalised matrix and the maxima
+def normalize(X):
+    X = np.asarray(X, dtype=float)
+    maxima = X.max(axis=0)
+    return X / maxima, maxima
+
+
+class LinearModel:
+    # alpha: learning rate, epochs: maximal number of epochs, batch_size: rows per step (None for
+    # all), epsilon: stop when the norm of the gradient is smaller, patience: epochs without
+    # improvement of the validation loss before stopping early, seed: for shuffling and initial weights
+    def __init__(self, alpha=1.0, epochs=1000, batch_size=None, shuffle=True, epsilon=1.0e-6, patience=10,
+                 seed=None, verbose=False):
+        self.alpha = alpha
+        self.epochs = epochs
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.epsilon = epsilon
+        self.patience = patience
+        self.seed = seed
+        self.verbose = verbose
+        self.w = None
+        self.epoch = None # last epoch that was run (as in the notebook)
+        self.history = [] # validation loss per epoch, if validation data is given
+        self._rng = None
+        self._buffers = None
+
+    def decision_function(self, X):
+        return np.asarray(X) @ self.w
+
+    def predict(self, X):
+        return self.decision_function(X)
+
+    # loss on a data set, used for early stopping
+    def loss(self, X, y):
+        return np.mean((np.ravel(y) - self.predict(X)) ** 2)
+
+    # error y - prediction of a batch
+    def _error(self, Xb, yb):
+        return yb - self.predict(Xb)
+
+    def _step_scale(self, batch_rows):
+        return batch_rows
+
+    # stop criterion after an epoch, from the norm of the last gradient and the epoch's errors
+    def _converged(self, grad_norm, misclassified):
+        return grad_norm < self.epsilon
+
+    # one epoch over X, y in (shuffled) mini-batches, returns the norm of the last gradient and
+    # the number of misclassified examples
+    def _run_epoch(self, X, y, rng) -> (float, int):
+        n, d = X.shape
+        batch = n if self.batch_size is None else min(self.batch_size, n)
+        gather = self.shuffle and batch < n
+        if gather:
+            if self._buffers is None or self._buffers[0].shape[0] < batch or self._buffers[0].shape[1] != d:
+                self._buffers = (np.empty((batch, d)), np.empty(batch)) # preallocated batch buffers
+            Xb, yb = self._buffers
+            order = rng.permutation(n)
+
+        misclassified = 0
+        grad_norm = np.inf
+        for start in range(0, n, batch):
+            stop = min(start + batch, n)
+            if gather:
+                idx = order[start:stop] # a view of the permutation
+                Xs, ys = Xb[:stop - start], yb[:stop - start]
+                np.take(X, idx, axis=0, out=Xs)
+                np.take(y, idx, out=ys)
+            else:
+                Xs, ys = X[start:stop], y[start:stop]
+
+            error = self._error(Xs, ys)
+            misclassified += np.count_nonzero(error)
+            grad = Xs.T @ error
+            grad_norm = np.linalg.norm(grad)
+            if grad_norm < self.epsilon:
+                break
+            self.w += self.alpha * grad / self._step_scale(stop - start)
+        return grad_norm, misclassified
+
+    def __prepare(self, X, y, w=None):
+        X = np.asarray(X, dtype=float)
+        y = np.ravel(np.asarray(y, dtype=float))
+        if w is not None:
+            self.w = np.array(w, dtype=float).ravel()
+        elif self.w is None or self.w.size != X.shape[1]:
+            self.w = np.zeros(X.shape[1])
+        if self._rng is None:
+            self._rng = np.random.default_rng(self.seed)
+        return X, y
+
+    # w: initial weights (zeros if None), validation: (X, y) for early stopping
+    def fit(self, X, y, w=None, validation=None):
+        self.w = None
+        self._rng = None
+        X, y = self.__prepare(X, y, w)
+        self.history = []
+
+        best = (np.inf, self.w.copy(), 0)
+        for self.epoch in range(self.epochs):
+            grad_norm, misclassified = self._run_epoch(X, y, self._rng)
+
+            if self.verbose and self.epoch % 100 == 0:
+                print("Epoch {}, gradient norm: {}, errors: {}".format(self.epoch, grad_norm, misclassified))
+
+            if validation is not None:
+                self.history.append(self.loss(*validation))
+                if self.history[-1] < best[0]:
+                    best = (self.history[-1], self.w.copy(), self.epoch)
+                elif self.epoch - best[2] >= self.patience:
+                    self.w = best[1]
+                    break
+
+            if self._converged(grad_norm, misclassified):
+                break
+        return self
+
+    # one pass over X, y, continuing from the current weights (zeros the first time)
+    def partial_fit(self, X, y):
+        X, y = self.__prepare(X, y)
+        self._run_epoch(X, y, self._rng)
+        return self
+
+    # training in a single pass over an iterable of chunks (X, y), which never have to be in memory
+    # together. The scalers (see scalers.py, applied in the given order) are updated with every chunk
+    # before it is transformed, i.e. a chunk is scaled with the statistics of all data seen so far.
+    # With intercept=True a column of ones is added after scaling.
+    def fit_stream(self, chunks, scalers=(), intercept=False):
+        for X, y in chunks:
+            for scaler in scalers:
+                X = scaler.partial_fit(X).transform(X)
+            if intercept:
+                X = np.hstack([np.ones((X.shape[0], 1)), X])
+            self.partial_fit(X, y)
+        return self
+
+    # prediction for raw rows, transformed with the (fitted) scalers as in fit_stream
+    def predict_scaled(self, X, scalers=(), intercept=False):
+        for scaler in scalers:
+            X = scaler.transform(X)
+        if intercept:
+            X = np.hstack([np.ones((X.shape[0], 1)), X])
+        return self.predict(X)
+
+
+class LinearRegression(LinearModel):
+    def __init__(self, alpha=0.05, epochs=1000, **options):
+        super().__init__(alpha, epochs, **options)
+
+
+class Perceptron(LinearModel):
+    # stops when at most max_misclassified examples were misclassified in an epoch
+    def __init__(self, alpha=1.0, epochs=10000, max_misclassified=0, epsilon=0.0, **options):
+        super().__init__(alpha, epochs, epsilon=epsilon, **options)
+        self.max_misclassified = max_misclassified
+
+    def predict(self, X, th=0):
+        return (self.decision_function(X) > th).astype(int)
+
+    # fraction of misclassified examples
+    def loss(self, X, y):
+        return np.mean(self.predict(X) != np.ravel(y))
+
+    def _step_scale(self, batch_rows):
+        return 1
+
+    def _converged(self, grad_norm, misclassified):
+        return misclassified <= self.max_misclassified
+
+
+class LogisticRegression(LinearModel):
+    def __init__(self, alpha=150.0, epochs=20000, epsilon=1.0e-4, **options):
+        super().__init__(alpha, epochs, epsilon=epsilon, **options)
+
+    # P(1 | x) of every row
+    def predict_proba(self, X):
+        return logistic(self.decision_function(X))
+
+    def predict(self, X):
+        return (self.predict_proba(X) > 0.5).astype(int)
+
+    # mean negative log-likelihood
+    def loss(self, X, y):
+        z = self.decision_function(X)
+        y = np.ravel(y)
+        return np.mean(np.logaddexp(0.0, z) - y * z)
+
+    def _error(self, Xb, yb):
+        return yb - self.predict_proba(Xb)
+
+
+# leave-one-out cross validation as in the notebook: number of correctly classified rows, where
+# make_model() returns a new (unfitted) model
+def leave_one_out(make_model, X, y):
+    X = np.asarray(X, dtype=float)
+    y = np.ravel(y)
+    keep = np.ones(len(y), dtype=bool)
+    correct = 0
+    for fold in range(len(y)):
+        keep[fold] = False
+        model = make_model().fit(X[keep], y[keep])
+        correct += int(model.predict(X[fold:fold + 1])[0] == y[fold])
+        keep[fold] = True
+    return correct
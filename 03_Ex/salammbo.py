@@ -0,0 +1,23 @@
+#
+# The data set of the notebooks: number of letters and number of A's in the 15 chapters of the
+# English and the French versions of Salammbo.
+#
+# X_SALAMMBO / Y_SALAMMBO is the classification set of ai_lab_perceptron_students.ipynb and
+# Salammbo_pytorch.ipynb (English chapters first), 0 = English, 1 = French.
+#
+
+import numpy as np
+
+STAT_EN = np.array(
+    [[35680, 2217], [42514, 2761], [15162, 990], [35298, 2274],
+     [29800, 1865], [40255, 2606], [74532, 4805], [37464, 2396],
+     [31030, 1993], [24843, 1627], [36172, 2375], [39552, 2560],
+     [72545, 4597], [75352, 4871], [18031, 1119]])
+STAT_FR = np.array(
+    [[36961, 2503], [43621, 2992], [15694, 1042], [36231, 2487],
+     [29945, 2014], [40588, 2805], [75255, 5062], [37709, 2643],
+     [30899, 2126], [25486, 1784], [37497, 2641], [40398, 2766],
+     [74105, 5047], [76725, 5312], [18317, 1215]])
+
+X_SALAMMBO = np.vstack([STAT_EN, STAT_FR]).astype(np.float32)
+Y_SALAMMBO = np.array([0] * 15 + [1] * 15)
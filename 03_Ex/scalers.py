@@ -0,0 +1,175 @@
+#
+# Online versions of the scalers used in the notebooks (sklearn's MinMaxScaler, StandardScaler and
+# Normalizer, and the notebook's normalize, i.e. division by the column maxima).
+#
+# The statistics are updated chunk by chunk with partial_fit, so the data never has to be in memory
+# at once: minima / maxima directly, mean and variance with Welford's algorithm generalised to chunks
+# (Chan et al.): the count, mean and sum of squared deviations of a chunk are computed vectorised and
+# merged into the running ones. Two scalers fitted on different parts of the data can be merged the
+# same way, e.g. from parallel workers.
+#
+# Like sklearn, constant columns are not scaled (scale 1). The state of a scaler is a dict of plain
+# lists (get_state / from_state), save / load write it as JSON.
+#
+
+import json
+from abc import ABC, abstractmethod
+
+import numpy as np
+
+
+class OnlineScaler(ABC):
+    def __init__(self):
+        self.n = 0
+
+    @abstractmethod
+    def partial_fit(self, X):
+        pass
+
+    # fits on an iterable of chunks
+    def fit(self, chunks):
+        for X in chunks:
+            self.partial_fit(X)
+        return self
+
+    @abstractmethod
+    def transform(self, X):
+        pass
+
+    def get_state(self) -> dict:
+        state = {"type": type(self).__name__}
+        for key, value in vars(self).items():
+            state[key] = value.tolist() if isinstance(value, np.ndarray) else value
+        return state
+
+    @staticmethod
+    def from_state(state):
+        scaler = SCALERS[state["type"]]()
+        for key, value in state.items():
+            if key != "type":
+                setattr(scaler, key, np.array(value) if isinstance(value, list) else value)
+        return scaler
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.get_state(), f)
+
+    @staticmethod
+    def load(path):
+        with open(path) as f:
+            return OnlineScaler.from_state(json.load(f))
+
+
+def _scale(width):
+    return np.where(width == 0.0, 1.0, width)
+
+
+class MinMaxScaler(OnlineScaler):
+    def __init__(self):
+        super().__init__()
+        self.min = None
+        self.max = None
+
+    def partial_fit(self, X):
+        X = np.asarray(X, dtype=float)
+        if X.shape[0] == 0:
+            return self
+        if self.min is None:
+            self.min, self.max = X.min(axis=0), X.max(axis=0)
+        else:
+            np.minimum(self.min, X.min(axis=0), out=self.min)
+            np.maximum(self.max, X.max(axis=0), out=self.max)
+        self.n += X.shape[0]
+        return self
+
+    def merge(self, other):
+        if other.min is not None:
+            self.min = other.min.copy() if self.min is None else np.minimum(self.min, other.min)
+            self.max = other.max.copy() if self.max is None else np.maximum(self.max, other.max)
+            self.n += other.n
+        return self
+
+    def transform(self, X):
+        return (np.asarray(X, dtype=float) - self.min) / _scale(self.max - self.min)
+
+    def inverse_transform(self, X):
+        return np.asarray(X, dtype=float) * _scale(self.max - self.min) + self.min
+
+
+# the notebook's normalize: every column divided by its maximum
+class MaxScaler(MinMaxScaler):
+    def transform(self, X):
+        return np.asarray(X, dtype=float) / _scale(self.max)
+
+    def inverse_transform(self, X):
+        return np.asarray(X, dtype=float) * _scale(self.max)
+
+
+class StandardScaler(OnlineScaler):
+    def __init__(self, with_mean=True, with_std=True):
+        super().__init__()
+        self.with_mean = with_mean
+        self.with_std = with_std
+        self.mean = None
+        self.m2 = None # sum of squared deviations from the mean
+
+    def __combine(self, n, mean, m2):
+        if self.mean is None:
+            self.n, self.mean, self.m2 = n, mean, m2
+            return
+        total = self.n + n
+        delta = mean - self.mean
+        self.mean = self.mean + delta * (n / total)
+        self.m2 = self.m2 + m2 + delta ** 2 * (self.n * n / total)
+        self.n = total
+
+    def partial_fit(self, X):
+        X = np.asarray(X, dtype=float)
+        if X.shape[0] == 0:
+            return self
+        mean = X.mean(axis=0)
+        self.__combine(X.shape[0], mean, np.sum((X - mean) ** 2, axis=0))
+        return self
+
+    def merge(self, other):
+        if other.mean is not None:
+            self.__combine(other.n, other.mean.copy(), other.m2.copy())
+        return self
+
+    # population variance, as sklearn
+    def get_var(self):
+        return self.m2 / self.n
+
+    def transform(self, X):
+        X = np.asarray(X, dtype=float)
+        if self.with_mean:
+            X = X - self.mean
+        if self.with_std:
+            X = X / _scale(np.sqrt(self.get_var()))
+        return X
+
+    def inverse_transform(self, X):
+        X = np.asarray(X, dtype=float)
+        if self.with_std:
+            X = X * _scale(np.sqrt(self.get_var()))
+        if self.with_mean:
+            X = X + self.mean
+        return X
+
+
+# every row scaled to unit length, there is nothing to fit
+class Normalizer(OnlineScaler):
+    def partial_fit(self, X):
+        self.n += np.shape(X)[0]
+        return self
+
+    def merge(self, other):
+        self.n += other.n
+        return self
+
+    def transform(self, X):
+        X = np.asarray(X, dtype=float)
+        return X / _scale(np.linalg.norm(X, axis=1, keepdims=True))
+
+
+SCALERS = {c.__name__: c for c in (MinMaxScaler, MaxScaler, StandardScaler, Normalizer)}
@@ -0,0 +1,143 @@
+#
+# Hyperparameter sweep for the linear models of linear.py, training many models at once.
+#
+# For every feature scaling, the weight vectors of all (learning rate, seed) configurations are the
+# columns of one matrix W, so one epoch is a single X @ W, one error matrix and one X^T @ E for all of
+# them (full-batch descent, as the notebook's fit_batch). The update and stop rules are the ones of
+# the model classes in linear.py, applied column-wise: a model that has converged (gradient norm /
+# misclassified examples) is masked out and no longer computed, its epoch is recorded.
+#
+# The seed of a configuration draws its initial weights (normal with standard deviation init_scale,
+# all zeros as in the notebook for init_scale=0). The results are ranked by accuracy (on the
+# validation data if given, the training data otherwise; the negative mean squared error for linear
+# regression), then by the number of epochs to converge.
+#
+# Example (from the 03_Ex directory), on the notebook's data set or on features.py output:
+#
+#   python sweep.py --model perceptron --alphas 0.1 1 10 --seeds 0 1 2 --init-scale 0.1
+#   python sweep.py --model logistic --data features.npz --alphas 1 10 100 --scalings max standard
+#
+
+import argparse
+
+import numpy as np
+
+from linear import LinearRegression, Perceptron, LogisticRegression
+from scalers import MinMaxScaler, MaxScaler, StandardScaler, Normalizer
+from salammbo import X_SALAMMBO, Y_SALAMMBO
+
+MODELS = {"linear": LinearRegression, "perceptron": Perceptron, "logistic": LogisticRegression}
+SCALINGS = {"none": lambda: [], "max": lambda: [MaxScaler()], "minmax": lambda: [MinMaxScaler()],
+            "standard": lambda: [StandardScaler()], "normalize_standard": lambda: [Normalizer(), StandardScaler()]}
+
+
+# trains one model per column of W0 on X, y with the learning rates alphas (one per column).
+# model is an instance of a class of linear.py, only its rules and stop parameters are used.
+# Returns the final weights (d x M), the epoch at which every model stopped and whether it converged.
+def train_stacked(model, X, y, W0, alphas, epochs):
+    W = np.array(W0, dtype=float)
+    alphas = np.asarray(alphas, dtype=float)
+    Y = np.ravel(y).astype(float)[:, None]
+    stopped = np.full(W.shape[1], epochs - 1)
+    converged_models = np.zeros(W.shape[1], dtype=bool)
+    active = np.arange(W.shape[1])
+
+    for epoch in range(epochs):
+        if active.size == 0:
+            break
+        model.w = W[:, active]
+        error = model._error(X, Y)
+        grad = X.T @ error
+        grad_norms = np.linalg.norm(grad, axis=0)
+        misclassified = np.count_nonzero(error, axis=0)
+
+        step = grad_norms >= model.epsilon
+        W[:, active[step]] += alphas[active[step]] * grad[:, step] / model._step_scale(X.shape[0])
+
+        converged = np.asarray(model._converged(grad_norms, misclassified), dtype=bool)
+        stopped[active[converged]] = epoch
+        converged_models[active[converged]] = True
+        active = active[~converged]
+
+    model.w = None
+    return W, stopped, converged_models
+
+
+# score of the models in the columns of W on X, y: accuracy, or minus the mean squared error
+def scores(model, X, y, W):
+    model.w = W
+    predictions = model.predict(X)
+    model.w = None
+    y = np.ravel(y)[:, None]
+    if isinstance(model, LinearRegression):
+        return -np.mean((predictions - y) ** 2, axis=0)
+    return np.mean(predictions == y, axis=0)
+
+
+# all combinations of learning rates, seeds and scalings (names of SCALINGS or a dict name ->
+# function returning a list of scalers), ranked best first. Every result is a dict with the
+# configuration, the weights, the score and the epochs to converge (epochs if it did not).
+def sweep(X, y, model="perceptron", alphas=(1.0,), seeds=(0,), scalings=("none",), epochs=1000,
+          init_scale=0.0, intercept=True, validation=None, **model_options):
+    if not isinstance(scalings, dict):
+        scalings = {name: SCALINGS[name] for name in scalings}
+    template = MODELS[model](**model_options)
+    configs = [(alpha, seed) for alpha in alphas for seed in seeds]
+
+    results = []
+    for name, make_scalers in scalings.items():
+        scalers = make_scalers()
+        Xs = np.asarray(X, dtype=float)
+        for scaler in scalers:
+            Xs = scaler.partial_fit(Xs).transform(Xs)
+        Xv, yv = (Xs, y) if validation is None else (validation[0], validation[1])
+        if validation is not None:
+            for scaler in scalers:
+                Xv = scaler.transform(Xv)
+        if intercept:
+            Xs = np.hstack([np.ones((Xs.shape[0], 1)), Xs])
+            Xv = np.hstack([np.ones((Xv.shape[0], 1)), Xv])
+
+        W0 = np.column_stack([np.random.default_rng(seed).normal(scale=init_scale, size=Xs.shape[1])
+                              if init_scale else np.zeros(Xs.shape[1]) for _, seed in configs])
+        W, stopped, converged = train_stacked(template, Xs, y, W0, [alpha for alpha, _ in configs], epochs)
+        for k, score in enumerate(scores(template, Xv, yv, W)):
+            results.append({"scaling": name, "alpha": configs[k][0], "seed": configs[k][1], "score": float(score),
+                            "epochs": int(stopped[k]) + 1, "converged": bool(converged[k]),
+                            "w": W[:, k]})
+
+    results.sort(key=lambda r: (-r["score"], r["epochs"]))
+    return results
+
+
+def print_results(results, top=None):
+    print("{:>4} {:>18} {:>10} {:>6} {:>10} {:>8}".format("rank", "scaling", "alpha", "seed", "score", "epochs"))
+    for rank, r in enumerate(results[:top], 1):
+        print("{:>4} {:>18} {:>10.4g} {:>6} {:>10.4f} {:>8}{}".format(
+            rank, r["scaling"], r["alpha"], r["seed"], r["score"], r["epochs"], "" if r["converged"] else " (max)"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train and rank many linear models at once")
+    parser.add_argument("--model", choices=list(MODELS), default="perceptron")
+    parser.add_argument("--data", default=None, help=".npz with X and y (e.g. from features.py), default: the notebook's data")
+    parser.add_argument("--alphas", type=float, nargs="+", default=[1.0])
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--scalings", nargs="+", choices=list(SCALINGS), default=["max"])
+    parser.add_argument("--epochs", type=int, default=10000)
+    parser.add_argument("--init-scale", type=float, default=0.0, help="std of the initial weights (0: zeros)")
+    parser.add_argument("--top", type=int, default=20, help="number of results to print")
+    args = parser.parse_args()
+
+    if args.data:
+        data = np.load(args.data)
+        X, y = data["X"], data["y"]
+    else:
+        X, y = X_SALAMMBO.astype(float), Y_SALAMMBO
+
+    results = sweep(X, y, args.model, args.alphas, args.seeds, args.scalings, args.epochs, args.init_scale)
+    print_results(results, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#
+# Tests of linear.py against the results of ai_lab_perceptron_students.ipynb (the weights, epochs and
+# leave-one-out scores printed there), and of the batch step against per-sample updates.
+#
+# Run from the 03_Ex directory:
+#
+#   python -m pytest -q test_linear.py
+#
+
+import numpy as np
+
+from linear import LinearRegression, Perceptron, LogisticRegression, normalize, leave_one_out
+
+# the notebook's letter counts and counts of A's in the chapters of Salammbo
+STAT_EN = np.array(
+    [[35680, 2217], [42514, 2761], [15162, 990], [35298, 2274],
+     [29800, 1865], [40255, 2606], [74532, 4805], [37464, 2396],
+     [31030, 1993], [24843, 1627], [36172, 2375], [39552, 2560],
+     [72545, 4597], [75352, 4871], [18031, 1119]])
+STAT_FR = np.array(
+    [[36961, 2503], [43621, 2992], [15694, 1042], [36231, 2487],
+     [29945, 2014], [40588, 2805], [75255, 5062], [37709, 2643],
+     [30899, 2126], [25486, 1784], [37497, 2641], [40398, 2766],
+     [74105, 5047], [76725, 5312], [18317, 1215]])
+
+
+# the notebook's X_ (intercept column, divided by the column maxima) and y_ (0 = English, 1 = French)
+def notebook_classification_data():
+    X = np.vstack([STAT_EN, STAT_FR])
+    X, _ = normalize(np.hstack([np.ones((len(X), 1)), X]))
+    return X, np.array([0] * 15 + [1] * 15)
+
+
+# the notebook's linear regression fit_batch, also returning the last epoch
+def notebook_regression_fit_batch(X, y, alpha, w, epochs=1000, epsilon=1.0e-6):
+    for epoch in range(epochs):
+        error = y - X @ w
+        grad = X.T @ error
+        if np.linalg.norm(grad) < epsilon:
+            break
+        w = w + alpha * grad / X.shape[0]
+    return w, epoch
+
+
+def test_perceptron_matches_notebook():
+    X, y = notebook_classification_data()
+    model = Perceptron().fit(X, y)
+    np.testing.assert_allclose(model.w, [0.0, -388.30880417, 409.12104669], atol=1e-6)
+    assert model.epoch == 3566
+
+
+def test_linear_regression_matches_notebook():
+    X, _ = normalize(np.hstack([np.ones((len(STAT_FR), 1)), STAT_FR[:, :1]]))
+    y, _ = normalize(STAT_FR[:, 1:])
+    w0 = np.ones(2) / np.sqrt(2)
+
+    expected, last_epoch = notebook_regression_fit_batch(X, y, 0.05, w0[:, None], epochs=4000)
+    model = LinearRegression(alpha=0.05, epochs=4000).fit(X, y, w=w0)
+    np.testing.assert_allclose(model.w, expected.ravel(), rtol=1e-12)
+    assert model.epoch == last_epoch
+
+
+def test_logistic_regression_matches_notebook():
+    X, y = notebook_classification_data()
+    model = LogisticRegression().fit(X, y)
+    # the notebook's logistic function rounds differently from the overflow-free one, hence rtol
+    np.testing.assert_allclose(model.w, [2.97672295, -2037.3956607, 2128.23995776], rtol=1e-4)
+    assert model.epoch == 19999
+
+
+def test_leave_one_out_matches_notebook():
+    X, y = notebook_classification_data()
+    assert leave_one_out(Perceptron, X, y) == 30
+    assert leave_one_out(LogisticRegression, X, y) == 29
+
+
+def test_batch_step_is_sum_of_sample_updates():
+    X, y = notebook_classification_data()
+    w0 = np.random.default_rng(0).normal(size=X.shape[1])
+    for make_model, scale in [(LinearRegression, len(y)), (LogisticRegression, len(y)), (Perceptron, 1)]:
+        model = make_model(epochs=1).fit(X, y, w=w0)
+        w = w0.copy()
+        reference = make_model()
+        reference.w = w0
+        for x_i, y_i in zip(X, y):
+            w += reference.alpha * x_i * reference._error(x_i[None, :], y_i)[0] / scale
+        np.testing.assert_allclose(model.w, w, rtol=1e-10)
+
+
+def test_unshuffled_batches_of_one_are_per_sample_updates():
+    X, y = notebook_classification_data()
+    model = Perceptron(epochs=5, batch_size=1, shuffle=False).fit(X, y)
+    w = np.zeros(X.shape[1])
+    for epoch in range(5):
+        for x_i, y_i in zip(X, y):
+            w += (y_i - int(x_i @ w > 0)) * x_i
+    np.testing.assert_allclose(model.w, w)
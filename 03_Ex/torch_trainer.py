@@ -0,0 +1,138 @@
+#
+# Mini-batch training of the PyTorch classifier of Salammbo_pytorch.ipynb.
+#
+# The notebook's loop runs over the samples one by one, but computes the loss on the whole training
+# set in every iteration, i.e. N full passes per epoch. Here the samples come from a DataLoader over
+# a TensorDataset, so an epoch is one pass over the data in batches of batch_size (batch_size=1 is
+# the stochastic version the notebook meant). Evaluation runs in eval mode under torch.no_grad(),
+# the classes are thresholded in one vectorised comparison, and every epoch reports its throughput
+# in samples per second.
+#
+# Example (from the 03_Ex directory), the notebook's data set:
+#
+#   python torch_trainer.py --epochs 50 --batch-size 1
+#
+
+import argparse
+import time
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.utils.data import DataLoader, TensorDataset
+
+from salammbo import X_SALAMMBO, Y_SALAMMBO
+
+
+# the notebook's classifier, equivalent to a logistic regression
+class Model(nn.Module):
+    def __init__(self, input_dim):
+        super(Model, self).__init__()
+        self.layer1 = nn.Linear(input_dim, 1)
+
+    def forward(self, x):
+        x = torch.sigmoid(self.layer1(x))
+        return x
+
+
+# classes 0 / 1 of predicted probabilities (tensor or array), replaces the notebook's predict_class
+def predict_class(preds, threshold=0.5):
+    if isinstance(preds, torch.Tensor):
+        return (preds >= threshold).long().view(-1)
+    return (np.asarray(preds) >= threshold).astype(int).ravel()
+
+
+def to_dataset(X, y=None) -> TensorDataset:
+    X = torch.as_tensor(np.asarray(X), dtype=torch.float32)
+    if y is None:
+        return TensorDataset(X)
+    return TensorDataset(X, torch.as_tensor(np.asarray(y), dtype=torch.float32).view(-1, 1))
+
+
+class Trainer:
+    # loss_fn and optimizer default to the notebook's (binary cross entropy, SGD with lr=0.01)
+    def __init__(self, model, loss_fn=None, optimizer=None, lr=0.01, batch_size=32, shuffle=True, seed=None,
+                 eval_batch_size=65536, verbose=True):
+        self.model = model
+        self.loss_fn = loss_fn if loss_fn is not None else nn.BCELoss()
+        self.optimizer = optimizer if optimizer is not None else torch.optim.SGD(model.parameters(), lr=lr)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.eval_batch_size = eval_batch_size
+        self.verbose = verbose
+        self.generator = torch.Generator()
+        if seed is not None:
+            self.generator.manual_seed(seed)
+        self.history = [] # per epoch: mean training loss, samples/sec (and validation loss / accuracy)
+
+    # trains for the given number of epochs, validation: (X, y) evaluated after every epoch
+    def fit(self, X, y, epochs=50, validation=None):
+        loader = DataLoader(to_dataset(X, y), batch_size=self.batch_size, shuffle=self.shuffle,
+                            generator=self.generator)
+        n = len(loader.dataset)
+        for epoch in range(epochs):
+            self.model.train()
+            total_loss = torch.zeros(())
+            start = time.perf_counter()
+            for xb, yb in loader:
+                loss = self.loss_fn(self.model(xb), yb)
+                self.optimizer.zero_grad()
+                loss.backward()
+                self.optimizer.step()
+                total_loss += loss.detach() * len(xb)
+            seconds = time.perf_counter() - start
+
+            record = {"epoch": epoch, "loss": total_loss.item() / n, "samples_per_sec": n / seconds}
+            if validation is not None:
+                record["val_loss"], record["val_accuracy"] = self.evaluate(*validation)
+            self.history.append(record)
+            if self.verbose:
+                print(", ".join("{}: {:.4g}".format(k, v) for k, v in record.items()))
+        return self
+
+    # probabilities of class 1 for all rows, in batches without building the autograd graph
+    def predict_proba(self, X) -> torch.Tensor:
+        self.model.eval()
+        with torch.no_grad():
+            loader = DataLoader(to_dataset(X), batch_size=self.eval_batch_size)
+            return torch.cat([self.model(xb) for (xb,) in loader]).view(-1)
+
+    def predict(self, X, threshold=0.5) -> torch.Tensor:
+        return predict_class(self.predict_proba(X), threshold)
+
+    # mean loss and accuracy on a data set
+    def evaluate(self, X, y) -> (float, float):
+        y = torch.as_tensor(np.asarray(y), dtype=torch.float32).view(-1)
+        probs = self.predict_proba(X)
+        with torch.no_grad():
+            loss = self.loss_fn(probs, y).item()
+        accuracy = (predict_class(probs) == y.long()).float().mean().item()
+        return loss, accuracy
+
+    # mean training throughput over all epochs so far
+    def samples_per_sec(self) -> float:
+        return float(np.mean([r["samples_per_sec"] for r in self.history])) if self.history else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the Salammbo classifier with mini-batches")
+    parser.add_argument("--epochs", type=int, default=50)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--lr", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=1337)
+    args = parser.parse_args()
+
+    torch.manual_seed(args.seed)
+    # the notebook's scaling: unit length rows (Normalizer), then zero mean and unit variance (StandardScaler)
+    X = X_SALAMMBO / np.linalg.norm(X_SALAMMBO, axis=1, keepdims=True)
+    X = (X - X.mean(axis=0)) / X.std(axis=0)
+
+    trainer = Trainer(Model(X.shape[1]), lr=args.lr, batch_size=args.batch_size, seed=args.seed, verbose=False)
+    trainer.fit(X, Y_SALAMMBO, args.epochs)
+    loss, accuracy = trainer.evaluate(X, Y_SALAMMBO)
+    print("weights:", trainer.model.layer1.weight.data.numpy().ravel(), "bias:", trainer.model.layer1.bias.data.numpy())
+    print("training loss {:.4f}, accuracy {:.3f}, {:.0f} samples/sec".format(loss, accuracy, trainer.samples_per_sec()))
+
+
+if __name__ == "__main__":
+    main()